@@ -0,0 +1,105 @@
+# animator.py
+import asyncio
+
+import discord
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`; one token = one message edit."""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "lock")
+
+    def __init__(self, rate, capacity, now=0.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.lock = asyncio.Lock()  # FIFO, so concurrent animations share the budget fairly
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class AnimationScheduler:
+    """Plays message-edit animations within per-channel and global edit budgets.
+
+    An animation is a timeline of (offset_seconds, state). Whenever an edit is allowed the
+    scheduler jumps to the newest state that is already due, so when a channel is behind,
+    intermediate frames are dropped and several rounds collapse into one edit. The final
+    state is always shown, and long timelines are compressed to `max_duration`.
+    """
+
+    def __init__(self, channel_rate=1.0, channel_burst=4, global_rate=30.0, global_burst=30, max_duration=45.0):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.max_duration = max_duration
+        self._global = TokenBucket(global_rate, global_burst)
+        self._channels = {}  # {channel_id: TokenBucket}
+        self.sent = 0
+        self.dropped = 0
+
+    def _bucket(self, channel_id, now):
+        bucket = self._channels.get(channel_id)
+        if bucket is None:
+            if len(self._channels) > 5000:
+                # forget channels whose budget has fully recovered
+                for cid in [cid for cid, b in self._channels.items() if not b.lock.locked() and b.delay(now) == 0 and b.tokens >= b.capacity]:
+                    del self._channels[cid]
+            bucket = self._channels[channel_id] = TokenBucket(self.channel_rate, self.channel_burst, now)
+        return bucket
+
+    async def play(self, message, channel_id, timeline, render):
+        """Replay `timeline` on `message`; render(state, covered_states) -> embed.
+
+        `covered_states` are all states merged into this edit (including the shown one),
+        so the renderer can summarise skipped rounds.
+        """
+        if not timeline:
+            return
+        loop = asyncio.get_running_loop()
+        total = timeline[-1][0]
+        scale = min(1.0, self.max_duration / total) if total > 0 else 1.0
+        start = loop.time()
+        last = -1
+        n = len(timeline)
+        while last < n - 1:
+            now = loop.time()
+            due_at = start + timeline[last + 1][0] * scale
+            if now < due_at:
+                await asyncio.sleep(due_at - now)
+                continue
+            bucket = self._bucket(channel_id, now)
+            async with bucket.lock:
+                while True:
+                    now = loop.time()
+                    wait = max(bucket.delay(now), self._global.delay(now))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                bucket.take(now)
+                self._global.take(now)
+            # newest frame that is already due
+            j = last + 1
+            while j + 1 < n and start + timeline[j + 1][0] * scale <= now:
+                j += 1
+            self.dropped += j - (last + 1)
+            covered = [state for _, state in timeline[last + 1:j + 1]]
+            last = j
+            try:
+                await message.edit(embed=render(timeline[j][1], covered))
+                self.sent += 1
+            except discord.HTTPException:
+                pass
+
+    def stats(self):
+        return {"sent": self.sent, "dropped": self.dropped, "channels": len(self._channels)}
@@ -0,0 +1,105 @@
+# assets.py
+import asyncio
+import json
+import os
+from collections import namedtuple
+
+from imaging import make_variants
+
+# data is the encoded file held in memory (None when serving the untouched source file)
+Asset = namedtuple("Asset", "name variant filename data path")
+
+
+def _fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+class AssetStore:
+    """Pre-sized character art (card / thumb / portrait variants) served from memory.
+
+    `build()` runs once at startup: it checks each source image against a JSON manifest,
+    regenerates variants only for images that changed, and loads the variant bytes into
+    memory. After that, lookups are dict reads with no file-system calls.
+    """
+
+    def __init__(self, cache_dir=os.path.join(".cache", "assets"), webp=False):
+        self.cache_dir = cache_dir
+        self.webp = webp
+        self.ready = False
+        self._assets = {}   # {(name, variant): Asset}
+        self._sources = {}  # {name: source path or None}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _read_variants(self, entry):
+        out = {}
+        for variant, filename in entry.get("variants", {}).items():
+            try:
+                with open(os.path.join(self.cache_dir, filename), "rb") as fh:
+                    out[variant] = (filename, fh.read())
+            except OSError:
+                return None  # incomplete set on disk; rebuild
+        return out
+
+    async def build(self, sources, render_service):
+        """Build/refresh variants for {character name: source image path} and load them."""
+        manifest = await asyncio.to_thread(self._load_manifest)
+        for name, src in sources.items():
+            fingerprint = await asyncio.to_thread(_fingerprint, src)
+            if fingerprint is None:
+                self._sources[name] = None
+                continue
+            self._sources[name] = src
+            stem = os.path.splitext(os.path.basename(src))[0]
+            entry = manifest.get(stem)
+            loaded = None
+            if entry and entry.get("fingerprint") == fingerprint and entry.get("webp") == self.webp:
+                loaded = await asyncio.to_thread(self._read_variants, entry)
+            if not loaded:
+                files = await render_service.submit(make_variants, src, self.cache_dir, stem, self.webp, timeout=60.0)
+                entry = manifest[stem] = {"fingerprint": fingerprint, "webp": self.webp, "variants": files or {}}
+                loaded = await asyncio.to_thread(self._read_variants, entry) or {}
+            for variant, (filename, data) in loaded.items():
+                self._assets[(name, variant)] = Asset(name, variant, filename, data, os.path.join(self.cache_dir, filename))
+        await asyncio.to_thread(self._save_manifest, manifest)
+        self.ready = True
+
+    def get(self, name, variant="card"):
+        """Asset for the character's art; the original file if no variant exists; None if no art."""
+        asset = self._assets.get((name, variant))
+        if asset is not None:
+            return asset
+        src = self._sources.get(name)
+        if src:
+            return Asset(name, variant, "character.png", None, src)
+        return None
+
+    def path(self, name, variant="card"):
+        asset = self.get(name, variant)
+        return asset.path if asset is not None else None
+
+    def stats(self):
+        return {
+            "variants": len(self._assets),
+            "bytes": sum(len(a.data) for a in self._assets.values()),
+        }
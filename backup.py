@@ -0,0 +1,274 @@
+# backup.py
+"""Online backups and streaming export/import of the player tables.
+
+    python backup.py backup                        # anime.db -> backups/anime-<time>.db
+    python backup.py backup --out snapshot.db --verify
+    python backup.py export --format jsonl --out export/   # collection/user_wallet/user_profile
+    python backup.py import export/                 # into anime.db (migrated first)
+    python backup.py import export/ --replace       # clear those tables first
+
+Backups use SQLite's online backup API in small page batches from a read-only connection
+holding one WAL snapshot, so the bot keeps writing while it runs. Exports and imports stream
+row by row and use constant memory however many cards there are.
+"""
+import argparse
+import asyncio
+import csv
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+
+BACKUP_DIR = "backups"
+
+# Exported columns per table (ROWIDs are not exported; slots are)
+TABLES = {
+    "collection": ("user_id", "character_name", "anime", "rarity", "hp", "attack", "defense", "speed", "iv", "level", "exp", "slot"),
+    "user_wallet": ("user_id", "coins"),
+    "user_profile": ("user_id", "level", "exp"),
+}
+# Wallet/profile rows are upserted by user_id; cards are appended
+UPSERT_KEYS = {"user_wallet": "user_id", "user_profile": "user_id"}
+FORMATS = ("jsonl", "csv")
+
+
+def _read_only(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, isolation_level=None)
+
+
+# -------------------- BACKUP --------------------
+def backup_database(src_path, dest_path, pages=256, pause=0.005, verify=False, progress=None):
+    """Copy src_path to dest_path online, `pages` pages per step. Blocking: use asyncio.to_thread.
+
+    Returns {"path", "bytes", "pages", "seconds", "check"}. The copy is written to a .part file
+    and renamed when complete, so dest_path is never a half-written database.
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    part = dest_path + ".part"
+    if os.path.exists(part):
+        os.remove(part)
+    src = _read_only(src_path)
+    dst = sqlite3.connect(part)
+    total = [0]
+
+    def step(status, remaining, count):
+        total[0] = count
+        if progress is not None:
+            progress(count - remaining, count)
+        if pause:
+            time.sleep(pause)  # leave disk bandwidth for the bot between batches
+
+    try:
+        # One read transaction for the whole copy: under WAL writers keep going, and since the
+        # snapshot can't change underneath us the backup never restarts from page 1
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages, progress=step)
+        src.execute("COMMIT")
+        check = dst.execute("PRAGMA quick_check").fetchone()[0] if verify else None
+    finally:
+        src.close()
+        dst.close()
+    if check not in (None, "ok"):
+        os.remove(part)
+        raise sqlite3.DatabaseError(f"backup failed verification: {check}")
+    os.replace(part, dest_path)
+    return {"path": dest_path, "bytes": os.path.getsize(dest_path), "pages": total[0],
+            "seconds": time.perf_counter() - start, "check": check}
+
+
+def backup_path(src_path, directory=BACKUP_DIR):
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    return os.path.join(directory, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}.db")
+
+
+def prune_backups(src_path, directory=BACKUP_DIR, keep=5):
+    """Delete all but the newest `keep` timestamped backups of src_path; returns the removed paths."""
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    found = sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(stem)}-*.db")))
+    removed = found[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+# -------------------- EXPORT --------------------
+def export_table(conn, table, fh, fmt="jsonl"):
+    """Stream one table to an open text file; returns the row count."""
+    columns = TABLES[table]
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY ROWID")
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for row in cursor:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in cursor:
+            fh.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            fh.write("\n")
+            count += 1
+    return count
+
+
+def export_database(db_path, out_dir, fmt="jsonl", tables=tuple(TABLES)):
+    """Write <out_dir>/<table>.<fmt> for each table from one consistent snapshot; returns {table: rows}."""
+    os.makedirs(out_dir, exist_ok=True)
+    conn = _read_only(db_path)
+    counts = {}
+    try:
+        conn.execute("BEGIN")  # same snapshot for every table
+        for table in tables:
+            path = os.path.join(out_dir, f"{table}.{fmt}")
+            with open(path + ".part", "w", encoding="utf-8", newline="") as fh:
+                counts[table] = export_table(conn, table, fh, fmt)
+            os.replace(path + ".part", path)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return counts
+
+
+# -------------------- IMPORT --------------------
+def _null(value):
+    return None if value == "" else value
+
+
+def read_rows(path, columns):
+    """Yield tuples in `columns` order from a .jsonl or .csv export (missing fields become NULL)."""
+    with open(path, encoding="utf-8", newline="") as fh:
+        if path.endswith(".csv"):
+            for record in csv.DictReader(fh):
+                yield tuple(_null(record.get(c)) for c in columns)
+        else:
+            for line in fh:
+                if line.strip():
+                    record = json.loads(line)
+                    yield tuple(record.get(c) for c in columns)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_table(conn, table, path, batch=5000):
+    """Stream rows from an export file into `table`, committing every `batch` rows; returns the count."""
+    columns = TABLES[table]
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    key = UPSERT_KEYS.get(table)
+    if key:
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+        sql += f" ON CONFLICT({key}) DO UPDATE SET {updates}"
+    count = 0
+    for chunk in _chunks(read_rows(path, columns), batch):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, chunk)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        count += len(chunk)
+    return count
+
+
+def import_database(db_path, in_dir, replace=False, tables=tuple(TABLES)):
+    """Load <in_dir>/<table>.jsonl|.csv into an already-migrated database; returns {table: rows}.
+
+    With `replace`, each imported table is emptied first; the user_stats triggers (including
+    migration 5's wallet DELETE trigger) keep the leaderboard in step either way. Afterwards
+    any player whose slots are no longer 1..N (missing, or clashing with cards already in
+    the database) is renumbered.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=5000")
+    counts = {}
+    try:
+        for table in tables:
+            path = next((p for p in (os.path.join(in_dir, f"{table}.{fmt}") for fmt in FORMATS) if os.path.exists(p)), None)
+            if path is None:
+                continue
+            if replace:
+                conn.execute(f"DELETE FROM {table}")
+            counts[table] = import_table(conn, table, path)
+        if "collection" in counts:
+            conn.execute("""
+                UPDATE collection SET slot = numbered.n
+                FROM (SELECT ROWID AS rid, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY slot IS NULL, slot, ROWID) AS n
+                      FROM collection WHERE user_id IN (
+                          SELECT user_id FROM collection GROUP BY user_id
+                          HAVING COUNT(slot) != COUNT(*) OR COUNT(DISTINCT slot) != COUNT(*) OR MAX(slot) != COUNT(*)
+                      )) AS numbered
+                WHERE collection.ROWID = numbered.rid
+            """)
+    finally:
+        conn.close()
+    return counts
+
+
+async def _migrate(db_path):
+    from storage import Storage
+    from migrations import migrate
+    storage = Storage(db_path, readers=1)
+    await storage.open()
+    try:
+        await migrate(storage)
+    finally:
+        await storage.close()
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="anime.db", help="database file (default anime.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backup", help="online backup to a new database file")
+    p.add_argument("--out", help=f"destination file (default {BACKUP_DIR}/<name>-<time>.db)")
+    p.add_argument("--pages", type=int, default=256, help="pages copied per step")
+    p.add_argument("--verify", action="store_true", help="run PRAGMA quick_check on the copy")
+    p.add_argument("--keep", type=int, default=0, help=f"prune {BACKUP_DIR}/ to the newest N backups")
+
+    p = sub.add_parser("export", help="stream tables to JSONL/CSV files")
+    p.add_argument("--out", required=True, help="output directory")
+    p.add_argument("--format", choices=FORMATS, default="jsonl")
+    p.add_argument("--tables", nargs="+", choices=tuple(TABLES), default=list(TABLES))
+
+    p = sub.add_parser("import", help="stream JSONL/CSV files into the database")
+    p.add_argument("dir", help="directory written by `export`")
+    p.add_argument("--replace", action="store_true", help="empty each imported table first")
+    p.add_argument("--tables", nargs="+", choices=tuple(TABLES), default=list(TABLES))
+    args = parser.parse_args(argv)
+
+    if args.command == "backup":
+        dest = args.out or backup_path(args.db)
+        info = backup_database(args.db, dest, pages=args.pages, verify=args.verify)
+        print(f"{info['path']}: {info['bytes'] / 1e6:.1f} MB, {info['pages']} pages in {info['seconds']:.1f}s"
+              + (f", quick_check {info['check']}" if info["check"] else ""))
+        if args.keep and not args.out:
+            for path in prune_backups(args.db, keep=args.keep):
+                print(f"pruned {path}")
+    elif args.command == "export":
+        for table, rows in export_database(args.db, args.out, args.format, args.tables).items():
+            print(f"{table}: {rows} rows")
+    else:
+        asyncio.run(_migrate(args.db))
+        for table, rows in import_database(args.db, args.dir, args.replace, args.tables).items():
+            print(f"{table}: {rows} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
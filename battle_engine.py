@@ -0,0 +1,59 @@
+# battle_engine.py
+# Headless combat rules. No Discord, no sleeps: a battle is computed up front and the
+# bot only replays the returned turn log.
+import random
+from collections import namedtuple
+
+# attacker: 0 = first fighter, 1 = second; hp values are after the hit
+Turn = namedtuple("Turn", "round attacker damage p1_hp p2_hp")
+BattleResult = namedtuple("BattleResult", "winner turns seed")
+
+
+def damage_for(attacker, defender, rng=None, variance=0.0):
+    """attack - defense, at least 1; optionally scaled by +/- variance using rng."""
+    damage = max(1, attacker["attack"] - defender["defense"])
+    if variance and rng is not None:
+        damage = max(1, round(damage * rng.uniform(1.0 - variance, 1.0 + variance)))
+    return damage
+
+
+def simulate_battle(p1, p2, seed=None, variance=0.0, max_turns=10000):
+    """Fight p1 against p2 (the `chosen` card dicts) and return a BattleResult.
+
+    Fighters alternate starting with p1. With the default variance of 0 the outcome
+    is fully determined by the stats; the seed only matters when variance is used.
+    If max_turns is reached the fighter with the larger share of HP left wins.
+    """
+    rng = random.Random(seed) if variance else None
+    hp = [p1["hp"], p2["hp"]]
+    fighters = (p1, p2)
+    # without variance the damage per side never changes, so compute it once
+    fixed = None if variance else (damage_for(p1, p2), damage_for(p2, p1))
+    turns = []
+    turn = 0
+    while hp[0] > 0 and hp[1] > 0 and turn < max_turns:
+        a = turn & 1
+        d = 1 - a
+        damage = fixed[a] if fixed else damage_for(fighters[a], fighters[d], rng, variance)
+        hp[d] = max(hp[d] - damage, 0)
+        turns.append(Turn(turn + 1, a, damage, hp[0], hp[1]))
+        turn += 1
+    if hp[1] <= 0:
+        winner = 0
+    elif hp[0] <= 0:
+        winner = 1
+    else:
+        winner = 0 if hp[0] / max(1, p1["hp"]) >= hp[1] / max(1, p2["hp"]) else 1
+    return BattleResult(winner, turns, seed)
+
+
+def simulate_many(matchups, seed=0, variance=0.0):
+    """Simulate many (p1, p2) pairs; each battle gets a reproducible seed derived from `seed`."""
+    rng = random.Random(seed)
+    return [simulate_battle(p1, p2, seed=rng.getrandbits(32), variance=variance) for p1, p2 in matchups]
+
+
+def win_rate(p1, p2, battles=1000, seed=0, variance=0.1):
+    """Fraction of `battles` that p1 wins against p2."""
+    results = simulate_many([(p1, p2)] * battles, seed=seed, variance=variance)
+    return sum(1 for r in results if r.winner == 0) / battles if battles else 0.0
@@ -0,0 +1,249 @@
+# benchmarks.py
+"""Offline microbenchmarks for the bot's hot paths.
+
+    python benchmarks.py                       # everything, prints JSON
+    python benchmarks.py --quick -o bench.json # skip the 10M-card database
+    python benchmarks.py --baseline bench_baseline.json         # exit 1 on regressions
+    python benchmarks.py --save-baseline bench_baseline.json    # record a new baseline
+
+Synthetic databases are generated once under .bench/ and reused.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import timeit
+
+BENCH_DIR = ".bench"
+FULL_SIZES = (1_000, 100_000, 10_000_000)
+QUICK_SIZES = (1_000, 100_000)
+CARDS_PER_USER = 50
+WHALE_CARDS = 5_000  # one heavy collector per database, for !collection / !info on a big collection
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min_us": samples[0] * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6,
+    }
+
+
+def bench(fn, *args, repeat=200, budget=2.0):
+    """Time fn(*args) up to `repeat` times or until `budget` seconds are spent."""
+    samples = []
+    deadline = time.perf_counter() + budget
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline and len(samples) >= 3:
+            break
+    return summarize(samples)
+
+
+def bench_loop(fn, *args, repeat=7):
+    """Time a sub-microsecond fn(*args) timeit-style: each sample is a batch of calls (sized by
+    Timer.autorange to ~0.2 s) divided by the batch size, so timer overhead and jitter average out."""
+    timer = timeit.Timer(lambda: fn(*args))
+    number, _ = timer.autorange()
+    return dict(summarize([total / number for total in timer.repeat(repeat, number)]), loops=number)
+
+
+async def abench(fn, *args, repeat=200, budget=2.0):
+    samples = []
+    deadline = time.perf_counter() + budget
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn(*args)
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline and len(samples) >= 3:
+            break
+    return summarize(samples)
+
+
+# -------------------- PURE HELPERS --------------------
+def bench_helpers(results):
+    from character import random_character
+    results["random_character"] = bench_loop(random_character)
+    try:
+        from bot import generate_stats, make_hint, hp_bar
+    except ImportError as e:
+        print(f"skipping bot helpers: {e}", file=sys.stderr)
+        return
+    results["generate_stats"] = bench_loop(generate_stats, "Mythic")
+    results["make_hint"] = bench_loop(make_hint, "Itsuki Nakano")
+    results["hp_bar"] = bench_loop(hp_bar, 73, 140)
+
+
+# -------------------- RENDERING --------------------
+def find_art(count):
+    from character import CHARACTERS, get_character_image
+    paths = [get_character_image(c["name"]) for c in CHARACTERS]
+    paths = [p for p in paths if os.path.exists(p)] or sorted(glob.glob("*.png"))
+    return paths[:count]
+
+
+def bench_rendering(results):
+    from imaging import Image, _compose_spawn_image, _compose_battle_image
+    if Image is None:
+        print("skipping rendering: Pillow is not installed", file=sys.stderr)
+        return
+    art = find_art(2)
+    if len(art) < 2:
+        print("skipping rendering: no character art found", file=sys.stderr)
+        return
+    from character import RARITY_WEIGHTS
+    for rarity in RARITY_WEIGHTS:
+        results[f"compose_spawn_image[{rarity}]"] = bench(_compose_spawn_image, art[0], rarity, repeat=10, budget=10.0)
+    results["compose_battle_image"] = bench(
+        _compose_battle_image, art[0], art[1], "Player One", 80, 140, "Player Two", 120, 150, "Epic", "Mythic",
+        repeat=10, budget=10.0,
+    )
+
+
+# -------------------- SQL --------------------
+def build_database(path, size):
+    """Synthetic anime.db with `size` cards; migrations add user_stats and the indexes afterwards."""
+    from character import CHARACTERS, RARITY_WEIGHTS
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""CREATE TABLE collection (user_id INTEGER, character_name TEXT, anime TEXT, rarity TEXT,
+        hp INTEGER, attack INTEGER, defense INTEGER, speed INTEGER, iv INTEGER,
+        level INTEGER DEFAULT 1, exp INTEGER DEFAULT 0, slot INTEGER)""")
+    conn.execute("CREATE TABLE user_wallet (user_id INTEGER PRIMARY KEY, coins INTEGER DEFAULT 0)")
+    conn.execute("CREATE TABLE user_profile (user_id INTEGER PRIMARY KEY, level INTEGER DEFAULT 1, exp INTEGER DEFAULT 0)")
+    rng = random.Random(size)
+    rarities = list(RARITY_WEIGHTS)
+    weights = list(RARITY_WEIGHTS.values())
+    whale_cards = min(WHALE_CARDS, size // 2)
+    users = max(1, (size - whale_cards) // CARDS_PER_USER)
+    slots = {}
+
+    def rows():
+        for i in range(size):
+            uid = 1 if i < whale_cards else 2 + rng.randrange(users)
+            slot = slots[uid] = slots.get(uid, 0) + 1
+            c = CHARACTERS[rng.randrange(len(CHARACTERS))]
+            yield (uid, c["name"], c["anime"], rng.choices(rarities, weights)[0],
+                   rng.randint(50, 150), rng.randint(25, 80), rng.randint(25, 80), rng.randint(10, 50), rng.randint(0, 31), slot)
+
+    conn.executemany("INSERT INTO collection (user_id, character_name, anime, rarity, hp, attack, defense, speed, iv, slot) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows())
+    conn.executemany("INSERT INTO user_wallet (user_id, coins) VALUES (?, ?)",
+                     ((uid, n * 25 + rng.randint(0, 500)) for uid, n in slots.items()))
+    conn.commit()
+    conn.close()
+    os.replace(tmp, path)
+
+
+async def bench_sql(results, sizes):
+    try:
+        from storage import Storage
+        from cards import card_page, get_card, card_count
+        from leaderboard import Leaderboard
+        from migrations import migrate
+    except ImportError as e:
+        print(f"skipping SQL: {e}", file=sys.stderr)
+        return
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    for size in sizes:
+        path = os.path.join(BENCH_DIR, f"cards_{size}.db")
+        if not os.path.exists(path):
+            print(f"generating {path} ...", file=sys.stderr)
+            build_database(path, size)
+        storage = Storage(path, readers=2)
+        await storage.open()
+        try:
+            await migrate(storage)
+            whale_total = await card_count(storage, 1)
+            middle = max(0, whale_total // 2 - 5)
+            board = Leaderboard(storage, ttl=0)
+            results[f"sql.collection_page[{size}]"] = await abench(card_page, storage, 1, middle, None, 10)
+            results[f"sql.info_get_card[{size}]"] = await abench(get_card, storage, 1, max(1, whale_total))
+            results[f"sql.card_count[{size}]"] = await abench(card_count, storage, 1)
+            results[f"sql.leaderboard_top10[{size}]"] = await abench(board.top)
+        finally:
+            await storage.close()
+
+
+# -------------------- BASELINE --------------------
+def compare(results, baseline, tolerance):
+    """Return [(name, baseline_us, current_us, ratio)] for benchmarks slower than tolerance x baseline."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = current["median_us"] / max(base["median_us"], 1e-9)
+        if ratio > tolerance:
+            regressions.append((name, base["median_us"], current["median_us"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="skip the 10M-card database")
+    parser.add_argument("--only", choices=("helpers", "render", "sql"), action="append", help="run only these groups")
+    parser.add_argument("-o", "--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown vs baseline median (default 1.25x)")
+    parser.add_argument("--save-baseline", help="also write results to this baseline file")
+    args = parser.parse_args(argv)
+
+    groups = set(args.only or ("helpers", "render", "sql"))
+    results = {}
+    if "helpers" in groups:
+        bench_helpers(results)
+    if "render" in groups:
+        bench_rendering(results)
+    if "sql" in groups:
+        asyncio.run(bench_sql(results, QUICK_SIZES if args.quick else FULL_SIZES))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fh:
+            fh.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, base, cur, ratio in regressions:
+            print(f"REGRESSION {name}: {base:.1f} us -> {cur:.1f} us ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.2f}x across {len(results)} benchmarks", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
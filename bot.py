@@ -4,27 +4,82 @@ from discord.ext import commands
 import random
 import asyncio
 import io
-try:
-    from PIL import Image, ImageDraw, ImageFont, ImageFilter
-except Exception:
-    Image = None
 import math
-import aiosqlite
 import os
-from character import random_character, get_character_image, CHARACTERS, RARITY_WEIGHTS
+import re
+import threading
+import time
+from character import random_character, get_character_image, catalog, CHARACTERS, RARITY_WEIGHTS
+from storage import Storage
+from spawn_cache import SpawnArtCache, spawn_filename
+from imaging import _compose_spawn_image, _compose_battle_image
+from render import RenderService
+from spawns import SpawnManager
+from cards import card_count, card_page, get_card, insert_card, delete_card, selection_cards, selection_summary, delete_cards
+from leaderboard import Leaderboard
+from migrations import migrate
+from backup import FORMATS as EXPORT_FORMATS, backup_database, backup_path, prune_backups, export_database
+from users import UserResolver
+from battle_engine import simulate_battle
+from animator import AnimationScheduler
+from progression import award_battle
+from names import NameIndex
+from assets import AssetStore
+from cdn_cache import AttachmentURLCache
+from metrics import BotMetrics
+from diagnostics import LoopWatchdog, sample_profile, top_frames
+from state import LocalState, RemoteState
+from timers import TimerWheel
+from confirmations import Confirmations
 
 
 OWNER_ID = 826736555459739648  # replace with your Discord user ID
 
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
-
-spawned_character = None
-spawn_channel = None
-message_counter = 0
-current_battles = {}  # {challenger_id: {"opponent_id":..., "stage":..., "choices":{}}}
-bot_locked = False  # Lock state for admin control
+# Clustered mode (cluster.py): each process runs a group of shards and shares state via STATE_URL
+SHARD_COUNT = os.getenv("BOT_SHARD_COUNT")
+SHARD_IDS = os.getenv("BOT_SHARD_IDS")
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, help_command=None, shard_count=int(SHARD_COUNT),
+        shard_ids=[int(i) for i in SHARD_IDS.split(",")] if SHARD_IDS else None,
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+storage = Storage("anime.db")  # opened once in setup_hook, shared by every command
+render_service = RenderService(workers=2, max_pending=8, timeout=10.0)
+assets = AssetStore(webp=os.getenv("ASSETS_WEBP") == "1")  # pre-sized character art, built in setup_hook
+cdn_urls = AttachmentURLCache()  # CDN URLs of art we've already uploaded
+richest = Leaderboard(storage, size=10, ttl=15.0)
+users = UserResolver(bot, ttl=600.0, concurrency=4)
+name_index = NameIndex.from_catalog(catalog)  # accent/alias/typo-tolerant !acatch matching
+animator = AnimationScheduler(channel_rate=1.0, channel_burst=4, global_rate=30.0, global_burst=30, max_duration=45.0)
+
+metrics = BotMetrics()  # Prometheus endpoint on METRICS_PORT (localhost; 0 disables)
+storage.on_query = metrics.query
+render_service.on_job = metrics.render
+watchdog = LoopWatchdog(threshold=0.25)  # off until the owner runs `!diag watch`
+profiling = False
+
+# Spawns, battles and the admin lock; shared through a state server when clustered
+STATE_URL = os.getenv("STATE_URL")  # e.g. tcp://127.0.0.1:8765
+state = RemoteState.from_url(STATE_URL) if STATE_URL else LocalState(SpawnManager(min_messages=25, max_messages=40))
+
+# One timer wheel for every timed event: spawn expiry, challenge and fighter-pick timeouts
+timers = TimerWheel(tick=0.5, slots=1024)
+SPAWN_TTL = float(os.getenv("SPAWN_TTL", "600"))  # seconds before an uncaught spawn flees; 0 = never
+CHALLENGE_TIMEOUT = 60.0
+PICK_TIMEOUT = 180.0
+despawn_timers = {}      # {channel_id: Timer}
+pending_challenges = {}  # {challenge message id: (challenger_id, opponent_id, Timer)}
+pick_timers = {}         # {(low player id, high player id): Timer}
+confirmations = Confirmations(timers)  # yes/no prompts: buttons, or a typed reply matched in on_message
+
+RELEASE_OR_KEEP = (
+    ("Release (+5 coins)", True, discord.ButtonStyle.danger, ("release", "r", "y", "yes")),
+    ("Keep", False, discord.ButtonStyle.success, ("keep", "k", "n", "no")),
+)
 
 RARITY_EMOJIS = {
     "Common": "",
@@ -35,6 +90,15 @@ RARITY_EMOJIS = {
 }
 
 # -------------------- HELPERS --------------------
+background_tasks = set()  # the event loop only keeps weak references to tasks
+
+def run_in_background(coro):
+    """create_task that holds a strong reference until the task finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 def generate_stats(rarity):
     base = {"Common":50,"Rare":70,"Epic":90,"Legendary":110,"Mythic":130}
     hp = base[rarity] + random.randint(0,20)
@@ -91,571 +155,600 @@ def create_spawn_embed(character):
     return embed
 
 
-def _compose_spawn_image(image_path, rarity=None):
-    """Return a BytesIO image (PNG or animated GIF) for spawn with glow/animation based on rarity."""
-    if Image is None:
+async def _render_spawn(image_path, rarity):
+    return await render_service.submit(_compose_spawn_image, image_path, rarity)
+
+spawn_cache = SpawnArtCache(_render_spawn)
+
+def art_path(name, variant="card"):
+    """File path of a character's art (pre-sized variant when built), or None if there is none."""
+    if assets.ready:
+        return assets.path(name, variant)  # manifest lookup, no file-system call
+    image_path = get_character_image(name)
+    return image_path if os.path.exists(image_path) else None
+
+def character_file(name, variant="card", stem=None):
+    """discord.File for a character's art, served from memory once the asset store is built.
+
+    Uploaded as e.g. naruto_uzumaki-card.png, or `stem` plus the art's extension when given
+    (spawns use "character" so the attachment name doesn't give the answer away).
+    """
+    asset = assets.get(name, variant) if assets.ready else None
+    if asset is not None and asset.data is not None:
+        filename = asset.filename if stem is None else stem + os.path.splitext(asset.filename)[1]
+        return discord.File(fp=io.BytesIO(asset.data), filename=filename)
+    path = art_path(name, variant)
+    return discord.File(path, filename="character.png") if path else None
+
+async def send_with_image(dest, embed, key, make_file):
+    """Send embed with an image, linking the CDN copy from an earlier upload when we have one.
+
+    `await make_file()` -> discord.File or None is only called when the image has to be uploaded.
+    Returns None without sending if there is neither a cached URL nor a file.
+    """
+    url = cdn_urls.get(key)
+    if url:
+        embed.set_image(url=url)
+        return await dest.send(embed=embed)
+    file = await make_file()
+    if file is None:
         return None
+    embed.set_image(url=f"attachment://{file.filename}")
+    msg = await dest.send(file=file, embed=embed)
+    cdn_urls.record(key, msg, file.filename)
+    return msg
+
+async def send_character(dest, name, embed, variant="card"):
+    """Send an embed with the character's art as its image (or just the embed if there is no art)."""
+    async def make_file():
+        return character_file(name, variant)
+    msg = await send_with_image(dest, embed, ("art", name, variant), make_file)
+    return msg if msg is not None else await dest.send(embed=embed)
+
+async def send_spawn(channel, character, embed):
+    """Send a spawn embed with its (cached) composed artwork, falling back to the plain card art."""
+    rarity = character.get("rarity")
+    image_path = art_path(character["name"])
+    if image_path:
+        async def make_file():
+            composed = await spawn_cache.get(image_path, rarity)
+            return discord.File(fp=io.BytesIO(composed), filename=spawn_filename(rarity)) if composed else None
+        msg = await send_with_image(channel, embed, ("spawn", image_path, rarity), make_file)
+        if msg is not None:
+            return msg
+    # plain card art under a neutral attachment name: the spawn must not reveal who it is.
+    # Its own CDN key, so only URLs of these neutral uploads are reused here (never an
+    # !info upload, whose URL carries the character's filename)
+    async def make_plain_file():
+        return character_file(character["name"], stem="character")
+    msg = await send_with_image(channel, embed, ("spawn-art", character["name"]), make_plain_file)
+    if msg is None:
+        await channel.send(embed=embed)
+
+def schedule_despawn(channel, character):
+    """(Re)start the channel's expiry timer for a fresh spawn."""
+    cancel_despawn(channel.id)
+    if SPAWN_TTL > 0:
+        despawn_timers[channel.id] = timers.schedule(SPAWN_TTL, despawn, channel, character)
+
+def cancel_despawn(channel_id):
+    timer = despawn_timers.pop(channel_id, None)
+    if timer is not None:
+        timer.cancel()
+
+async def despawn(channel, character):
+    despawn_timers.pop(channel.id, None)
+    if not await state.spawn_clear(channel.id, character):
+        return
+    metrics.despawns.inc(character["rarity"])
     try:
-        img = Image.open(image_path).convert("RGBA")
-        w, h = img.size
-        pad = 120
-        canvas_size = (w + pad, h + pad)
-        base = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
-        cx = (canvas_size[0] - w) // 2
-        cy = 30
-
-        # rarity color
-        rc = {"Common": (120,120,120), "Rare": (30,144,255), "Epic": (147,112,219), "Legendary": (138,43,226), "Mythic": (255,215,0)}
-        color = rc.get(rarity, (100,100,100))
-
-        # create colored mask from image alpha
-        glow = Image.new("RGBA", img.size, color + (255,))
-        mask = img.split()[3]
-        glow.putalpha(mask)
-
-        # Legendary/Mythic: animated pulsing glow (GIF)
-        if rarity in ("Legendary", "Mythic"):
-            frames = []
-            for i in range(6):
-                radius = 6 + i * 3
-                alpha_mul = 120 + int(100 * (0.5 + 0.5 * math.sin(i / 6.0 * 2 * math.pi)))
-                g = glow.copy()
-                g = g.filter(ImageFilter.GaussianBlur(radius=radius))
-                # dim/brighten by multiplying alpha
-                alpha = g.split()[3].point(lambda p: min(255, int(p * (alpha_mul / 255.0))))
-                g.putalpha(alpha)
-                frame = base.copy()
-                frame.paste(g, (cx, cy), g)
-                frame.paste(img, (cx, cy), img)
-                frames.append(frame)
-            bio = io.BytesIO()
-            frames[0].save(bio, format="GIF", save_all=True, append_images=frames[1:], loop=0, duration=90, disposal=2)
-            bio.seek(0)
-            return bio
-        else:
-            g = glow.filter(ImageFilter.GaussianBlur(radius=18))
-            base.paste(g, (cx, cy), g)
-            base.paste(img, (cx, cy), img)
-            bio = io.BytesIO()
-            base.save(bio, format="PNG")
-            bio.seek(0)
-            return bio
-    except Exception:
-        return None
+        await channel.send(f"💨 **{character['name']}** got away! Nobody caught it in time.")
+    except discord.HTTPException:
+        pass
+
+def pick_key(a, b):
+    return (a, b) if a < b else (b, a)
+
+def cancel_pick_timeout(a, b):
+    timer = pick_timers.pop(pick_key(a, b), None)
+    if timer is not None:
+        timer.cancel()
+
+async def pick_expired(channel, a, b):
+    pick_timers.pop(pick_key(a, b), None)
+    battle = await state.battle_get(a)
+    if not battle or battle["stage"] != "choose" or battle["opponent_id"] != b:
+        return
+    await state.battle_end(a, b)
+    await channel.send(f"⌛ Battle between {users.mention(a)} and {users.mention(b)} cancelled: fighters weren't picked in time.")
+
+async def challenge_expired(channel, message_id):
+    if pending_challenges.pop(message_id, None) is not None:
+        await channel.send("❌ Battle request timed out.")
 
 # -------------------- EVENTS --------------------
+async def setup_hook():
+    # Runs once before the gateway connects (not on every reconnect like on_ready)
+    await storage.open()
+    # Schema changes happen once here, never on gateway reconnects
+    for version, name in await migrate(storage):
+        print(f"Applied migration {version}: {name}")
+    render_service.start()
+    timers.start()
+    run_in_background(prepare_art())
+    metrics.start_lag_monitor()
+    port = int(os.getenv("METRICS_PORT", "9108"))
+    if port:
+        try:
+            await metrics.serve(os.getenv("METRICS_HOST", "127.0.0.1"), port)
+        except OSError as e:
+            print(f"Metrics endpoint disabled: {e}")
+bot.setup_hook = setup_hook
+
+_disconnect = bot.close
+
+async def close():
+    # bot.run() calls this on logout or Ctrl+C: disconnect first so no new commands start,
+    # then stop background work and close the database (which runs PRAGMA optimize)
+    await _disconnect()
+    timers.stop()
+    watchdog.stop()
+    await metrics.close()
+    if isinstance(state, RemoteState):
+        await state.close()
+    render_service.shutdown()
+    await storage.close()
+bot.close = close
+
+@bot.before_invoke
+async def before_any_command(ctx):
+    metrics.command_started(ctx)
+
+@bot.after_invoke
+async def after_any_command(ctx):
+    metrics.command_finished(ctx)
+
+_live_gauges = (
+    metrics.registry.gauge("animebot_render_queue_depth", "Render jobs queued or running."),
+    metrics.registry.gauge("animebot_active_spawns", "Channels with an uncaught spawn."),
+    metrics.registry.gauge("animebot_active_battles", "Players in a battle or challenge."),
+    metrics.registry.gauge("animebot_guilds", "Servers the bot is in."),
+    metrics.registry.gauge("animebot_pending_timers", "Timers waiting on the timer wheel."),
+    metrics.registry.gauge("animebot_pending_prompts", "Confirmation prompts awaiting an answer."),
+)
+
+@metrics.registry.collector
+async def _collect_live_state():
+    render_depth, active_spawns, active_battles, guilds, pending_timers, pending_prompts = _live_gauges
+    render_depth.set(render_service.pending)
+    guilds.set(len(bot.guilds))
+    pending_timers.set(timers.pending())
+    pending_prompts.set(confirmations.pending())
+    counts = await state.counts()
+    active_spawns.set(counts["spawns"])
+    active_battles.set(counts["battles"])
+
+async def prepare_art():
+    """Background warm-up: build the asset manifest/variants, then pre-render every character x rarity spawn."""
+    await assets.build({c["name"]: get_character_image(c["name"]) for c in CHARACTERS}, render_service)
+    jobs = [(art_path(c["name"]), rarity) for c in CHARACTERS for rarity in RARITY_WEIGHTS]
+    await spawn_cache.warm([(path, rarity) for path, rarity in jobs if path])
+
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user}")
-    async with aiosqlite.connect("anime.db") as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS collection (
-            user_id INTEGER,
-            character_name TEXT,
-            anime TEXT,
-            rarity TEXT,
-            hp INTEGER,
-            attack INTEGER,
-            defense INTEGER,
-            speed INTEGER,
-            iv INTEGER
-        )
-        """)
-        # Ensure columns for leveling exist (ALTER will fail if column exists; ignore errors)
-        try:
-            await db.execute("ALTER TABLE collection ADD COLUMN level INTEGER DEFAULT 1")
-            await db.execute("ALTER TABLE collection ADD COLUMN exp INTEGER DEFAULT 0")
-        except Exception:
-            pass
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS user_wallet (
-            user_id INTEGER PRIMARY KEY,
-            coins INTEGER DEFAULT 0
-        )
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS user_profile (
-            user_id INTEGER PRIMARY KEY,
-            level INTEGER DEFAULT 1,
-            exp INTEGER DEFAULT 0
-        )
-        """)
-        await db.commit()
     print("Bot is ready!")
 
 @bot.event
 async def on_message(message):
-    global message_counter, spawned_character, spawn_channel, bot_locked
-
     if message.author.bot:
         return
     
     # Check if bot is locked (commands still process for admin)
-    if bot_locked and message.author.id != OWNER_ID:
+    if message.author.id != OWNER_ID and await state.is_locked():
         return
 
-    message_counter += 1
+    # Typed answer to an open yes/no prompt: one dict lookup, however many prompts are open
+    confirmations.dispatch(message)
 
-    if not spawned_character and message_counter >= random.randint(25,40):
-        spawned_character = random_character()
-        spawn_channel = message.channel
-        message_counter = 0
-
-        embed = create_spawn_embed(spawned_character)
-        image_path = get_character_image(spawned_character["name"])
-        if os.path.exists(image_path):
-            composed = _compose_spawn_image(image_path, spawned_character.get("rarity"))
-            if composed:
-                fname = "spawn.gif" if spawned_character.get("rarity") in ("Legendary","Mythic") else "spawn.png"
-                await spawn_channel.send(file=discord.File(fp=composed, filename=fname), embed=embed)
-            else:
-                file = discord.File(image_path, filename="character.png")
-                embed.set_image(url="attachment://character.png")
-                await spawn_channel.send(file=file, embed=embed)
-        else:
-            await spawn_channel.send(embed=embed)
+    if await state.spawn_tick(message.channel.id):
+        character = random_character()
+        await state.spawn_set(message.channel.id, character)
+        schedule_despawn(message.channel, character)
+        metrics.spawns.inc(character["rarity"], "message")
+        embed = create_spawn_embed(character)
+        await send_spawn(message.channel, character, embed)
 
     await bot.process_commands(message)
 
 # -------------------- COMMANDS --------------------
 @bot.command(aliases=["ac"])
 async def acatch(ctx, *, name: str):
-    global spawned_character, spawn_channel
     try:
-        if not spawned_character or ctx.channel != spawn_channel:
+        spawned_character = await state.spawn_get(ctx.channel.id)
+        if not spawned_character:
             return await ctx.send("❌ No character to catch here!")
 
-        user_input = name.strip().lower()
-        char_name = spawned_character["name"].strip().lower()
-        char_first_word = char_name.split()[0]  # Get first word only
-
-        if user_input != char_first_word and user_input != char_name:
+        # Full name, first word or an alias; accents/case ignored and small typos forgiven
+        if not name_index.matches(name, catalog.by_id[spawned_character["id"]]):
             return await ctx.send("❌ Wrong name!")
 
-        hp, attack, defense, speed, iv = generate_stats(spawned_character["rarity"])
-
-        async with aiosqlite.connect("anime.db") as db:
-            await db.execute(
-                "INSERT INTO collection (user_id, character_name, anime, rarity, hp, attack, defense, speed, iv) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (ctx.author.id, spawned_character["name"], spawned_character["anime"], spawned_character["rarity"], hp, attack, defense, speed, iv)
-            )
-            await db.execute(
-                "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + 25",
-                (ctx.author.id, 25)
-            )
-            await db.commit()
+        # First correct guess wins: the claim removes the spawn in the same step, so nobody
+        # else can catch it and the channel's next spawn cycle starts right away
+        if not await state.spawn_claim(ctx.channel.id, spawned_character):
+            return await ctx.send("❌ Too slow! Someone else caught it.")
+        cancel_despawn(ctx.channel.id)
 
-            # fetch the ROWID of the just-inserted collection entry
-            cursor = await db.execute(
-                "SELECT ROWID FROM collection WHERE user_id = ? AND character_name = ? ORDER BY ROWID DESC LIMIT 1",
-                (ctx.author.id, spawned_character["name"]) 
-            )
-            rid_row = await cursor.fetchone()
-            rowid = rid_row[0] if rid_row else None
+        stats = generate_stats(spawned_character["rarity"])
+        try:
+            async with storage.transaction() as db:
+                # ROWID of the just-inserted collection entry
+                rowid = await insert_card(db, ctx.author.id, spawned_character, stats)
+                await db.execute(
+                    "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + 25",
+                    (ctx.author.id, 25)
+                )
+        except Exception:
+            # nothing was saved; put the character back so it can still be caught
+            await state.spawn_set(ctx.channel.id, spawned_character)
+            schedule_despawn(ctx.channel, spawned_character)
+            raise
+        metrics.catches.inc(spawned_character["rarity"])
 
         emoji = RARITY_EMOJIS.get(spawned_character["rarity"], "")
         embed = discord.Embed(title=f"🎉 {emoji} You caught {spawned_character['name']}!", description=f"Anime: {spawned_character['anime']} | Rarity: **{spawned_character['rarity']}**", color=discord.Color.green())
-        image_path = get_character_image(spawned_character["name"])
-        if os.path.exists(image_path):
-            file = discord.File(image_path, filename="character.png")
-            embed.set_image(url="attachment://character.png")
-            await ctx.send(file=file, embed=embed)
-        else:
-            await ctx.send(embed=embed)
-
-        # Ask user via message if they want to immediately release this character for +5 coins
-        try:
-            await ctx.send(f"{ctx.author.mention}, reply with `release` (or `r`) to release **{spawned_character['name']}** and get 💵 5 coins, or `keep` (or `k`) to keep it. You have 30 seconds.")
-
-            def check_msg(m):
-                return m.author.id == ctx.author.id and m.channel == ctx.channel and m.content.lower() in ("release", "keep", "r", "k", "y", "n", "yes", "no")
-
-            msg = await bot.wait_for("message", timeout=30.0, check=check_msg)
-            resp = msg.content.lower()
-            if resp in ("release", "r", "y", "yes"):
-                async with aiosqlite.connect("anime.db") as db:
-                    if rowid:
-                        await db.execute("DELETE FROM collection WHERE ROWID = ?", (rowid,))
-                    await db.execute(
-                        "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + 5",
-                        (ctx.author.id, 5)
-                    )
-                    await db.commit()
-                await ctx.send(f"💔 You released **{spawned_character['name']}** and received 💵 5 coins.")
-            else:
-                await ctx.send("✅ Kept your new character. Enjoy!")
-        except asyncio.TimeoutError:
-            await ctx.send("⌛ No response. Kept your new character.")
+        await send_character(ctx, spawned_character["name"], embed)
 
-        spawned_character = None
-        spawn_channel = None
+        # The release offer is a separate follow-up; the catch itself is already complete
+        run_in_background(offer_release(ctx, rowid, spawned_character))
     except Exception as e:
         print(f"Error in acatch: {e}")
+        metrics.handled_errors.inc("acatch")
         import traceback
         traceback.print_exc()
         await ctx.send(f"❌ Error: {e}")
 
+async def offer_release(ctx, rowid, character):
+    """Ask whether to immediately release a fresh catch for +5 coins."""
+    try:
+        release = await confirmations.ask(
+            ctx, ctx.author.id,
+            f"{ctx.author.mention}, release **{character['name']}** and get 💵 5 coins, or keep it? Press a button or reply `release` (`r`) / `keep` (`k`). You have 30 seconds.",
+            RELEASE_OR_KEEP,
+        )
+        if release is None:
+            await ctx.send("⌛ No response. Kept your new character.")
+        elif release:
+            async with storage.transaction() as db:
+                if not await delete_card(db, rowid):
+                    return await ctx.send("❌ That character is no longer in your collection.")
+                await db.execute(
+                    "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + 5",
+                    (ctx.author.id, 5)
+                )
+            await ctx.send(f"💔 You released **{character['name']}** and received 💵 5 coins.")
+        else:
+            await ctx.send("✅ Kept your new character. Enjoy!")
+    except Exception as e:
+        print(f"Error in release prompt: {e}")
+        metrics.handled_errors.inc("acatch")
+
 @bot.command()
 async def hint(ctx):
-    if not spawned_character or ctx.channel != spawn_channel:
+    spawned_character = await state.spawn_get(ctx.channel.id)
+    if not spawned_character:
         return await ctx.send("❌ No character to hint right now.")
     await ctx.send(f"💡 Hint: {make_hint(spawned_character['name'])}")
 
+COLLECTION_PAGE_SIZE = 10
+
+def collection_page_embed(owner, rows, total):
+    """Embed for one page of a collection; rows are (slot, name, rarity, anime, level)."""
+    embed = discord.Embed(title=f"📦 {owner.display_name}'s Anime Collection", color=discord.Color.green())
+    for idx, name, rarity, anime, level in rows:
+        emoji = RARITY_EMOJIS.get(rarity, "")
+        embed.add_field(name=f"{idx}. {emoji} {name}", value=f"Anime: {anime} | Rarity: **{rarity}** | Lvl: **{level}**", inline=False)
+    # slots are dense, so the page number follows from the first slot shown
+    page = (rows[0][0] - 1) // COLLECTION_PAGE_SIZE + 1
+    pages = max(1, math.ceil(total / COLLECTION_PAGE_SIZE))
+    embed.set_footer(text=f"Page {page}/{pages} | {total} characters")
+    return embed
+
+class CollectionView(discord.ui.View):
+    """Button navigation for !collection; each press fetches a single page from the slot index."""
+
+    def __init__(self, owner, rows, total):
+        super().__init__(timeout=120)
+        self.owner = owner
+        self.rows = rows
+        self.total = total
+        self.message = None
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        at_start = self.rows[0][0] <= 1
+        at_end = self.rows[-1][0] >= self.total
+        self.first_page.disabled = self.prev_page.disabled = at_start
+        self.next_page.disabled = self.last_page.disabled = at_end
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.owner.id:
+            await interaction.response.send_message("❌ This isn't your collection. Use `!collection` to see yours.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction, after_slot=0, before_slot=None):
+        rows = await card_page(storage, self.owner.id, after_slot=after_slot, before_slot=before_slot, limit=COLLECTION_PAGE_SIZE)
+        self.total = await card_count(storage, self.owner.id)
+        if not rows:
+            # collection shrank under us; go back to the first page
+            rows = await card_page(storage, self.owner.id, limit=COLLECTION_PAGE_SIZE)
+        if not rows:
+            self.stop()
+            return await interaction.response.edit_message(content="📦 Your collection is empty.", embed=None, view=None)
+        self.rows = rows
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=collection_page_embed(self.owner, rows, self.total), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction, button):
+        await self._show(interaction)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.primary)
+    async def prev_page(self, interaction, button):
+        await self._show(interaction, before_slot=self.rows[0][0])
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, after_slot=self.rows[-1][0])
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction, button):
+        # last full page boundary, so page numbers stay aligned with the first page
+        start = (max(self.total, 1) - 1) // COLLECTION_PAGE_SIZE * COLLECTION_PAGE_SIZE
+        await self._show(interaction, after_slot=start)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
 @bot.command()
-async def collection(ctx):
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute(
-            "SELECT character_name, rarity, anime, COALESCE(level,1) FROM collection WHERE user_id = ?",
-            (ctx.author.id,)
-        )
-        rows = await cursor.fetchall()
+async def collection(ctx, page: int = 1):
+    total = await card_count(storage, ctx.author.id)
+    if not total:
+        return await ctx.send("📦 Your collection is empty.")
+    pages = math.ceil(total / COLLECTION_PAGE_SIZE)
+    page = max(1, min(page, pages))
+    rows = await card_page(storage, ctx.author.id, after_slot=(page - 1) * COLLECTION_PAGE_SIZE, limit=COLLECTION_PAGE_SIZE)
     if not rows:
         return await ctx.send("📦 Your collection is empty.")
-    embed = discord.Embed(title=f"📦 {ctx.author.display_name}'s Anime Collection", color=discord.Color.green())
-    for idx, (name, rarity, anime, level) in enumerate(rows, start=1):
-        emoji = RARITY_EMOJIS.get(rarity, "")
-        embed.add_field(name=f"{idx}. {emoji} {name}", value=f"Anime: {anime} | Rarity: **{rarity}** | Lvl: **{level}**", inline=False)
-    await ctx.send(embed=embed)
+    view = CollectionView(ctx.author, rows, total)
+    view.message = await ctx.send(embed=collection_page_embed(ctx.author, rows, total), view=view)
 
 @bot.command()
 async def info(ctx, index: int):
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute(
-            "SELECT character_name, anime, rarity, hp, attack, defense, speed, iv, COALESCE(level,1), COALESCE(exp,0) FROM collection WHERE user_id = ?",
-            (ctx.author.id,)
-        )
-        rows = await cursor.fetchall()
-    if not rows: return await ctx.send("📦 Your collection is empty.")
-    if index < 1 or index > len(rows): return await ctx.send(f"❌ Invalid number. You have {len(rows)} characters.")
-    name, anime, rarity, hp, attack, defense, speed, iv, level, exp = rows[index-1]
+    card = await get_card(storage, ctx.author.id, index)
+    if not card:
+        total = await card_count(storage, ctx.author.id)
+        if not total: return await ctx.send("📦 Your collection is empty.")
+        return await ctx.send(f"❌ Invalid number. You have {total} characters.")
+    name, anime, rarity, level, exp = card["name"], card["anime"], card["rarity"], card["level"], card["exp"]
+    hp, attack, defense, speed, iv = card["hp"], card["attack"], card["defense"], card["speed"], card["iv"]
     emoji = RARITY_EMOJIS.get(rarity, "")
     embed = discord.Embed(title=f"{emoji} {name}", description=f"Anime: {anime}\nRarity: **{rarity}** | Level: **{level}**", color=discord.Color.blue())
     embed.add_field(name="Stats", value=f"HP:{hp}\nAttack:{attack}\nDefense:{defense}\nSpeed:{speed}\nIV:{iv}", inline=False)
     embed.add_field(name="Experience", value=f"Level: {level}\nExp: {exp}/{level*100}", inline=False)
-    image_path = get_character_image(name)
-    if os.path.exists(image_path):
-        file = discord.File(image_path, filename="character.png")
-        embed.set_image(url="attachment://character.png")
-        await ctx.send(file=file, embed=embed)
-    else:
-        await ctx.send(embed=embed)
+    await send_character(ctx, name, embed)
 
 @bot.command()
 async def cc(ctx):
     """Clear your collection with confirmation."""
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM collection WHERE user_id = ?", (ctx.author.id,))
-        count_row = await cursor.fetchone()
-        count = count_row[0] if count_row else 0
+    count_row = await storage.fetchone("SELECT COUNT(*) FROM collection WHERE user_id = ?", (ctx.author.id,))
+    count = count_row[0] if count_row else 0
     
     if count == 0:
         return await ctx.send("📦 Your collection is already empty.")
     
     # Ask for confirmation
-    await ctx.send(f"{ctx.author.mention}, are you sure you want to clear your entire collection ({count} characters)? **This cannot be undone!** Reply with `yes` (or `y`) to confirm, or `no` (or `n`) to cancel. You have 30 seconds.")
-    
-    def check_msg(m):
-        return m.author.id == ctx.author.id and m.channel == ctx.channel and m.content.lower() in ("yes", "no", "y", "n")
-    
-    try:
-        msg = await bot.wait_for("message", timeout=30.0, check=check_msg)
-        resp = msg.content.lower()
-        if resp in ("yes", "y"):
-            async with aiosqlite.connect("anime.db") as db:
-                await db.execute("DELETE FROM collection WHERE user_id = ?", (ctx.author.id,))
-                await db.commit()
-            await ctx.send(f"🗑️ Your anime collection ({count} characters) has been cleared!")
-        else:
-            await ctx.send("❌ Clear collection cancelled.")
-    except asyncio.TimeoutError:
+    confirmed = await confirmations.ask(ctx, ctx.author.id, f"{ctx.author.mention}, are you sure you want to clear your entire collection ({count} characters)? **This cannot be undone!** Press a button or reply `yes` (`y`) / `no` (`n`). You have 30 seconds.")
+    if confirmed is None:
         await ctx.send("⌛ No response. Clear collection cancelled.")
+    elif confirmed:
+        await storage.execute("DELETE FROM collection WHERE user_id = ?", (ctx.author.id,))
+        await ctx.send(f"🗑️ Your anime collection ({count} characters) has been cleared!")
+    else:
+        await ctx.send("❌ Clear collection cancelled.")
 
 @bot.command()
 async def leaderboard(ctx):
-    async with aiosqlite.connect("anime.db") as db:
-        # Combine users from collection and wallet, show coins and card counts
-        cursor = await db.execute("""
-            SELECT u.user_id AS user_id,
-                   COALESCE(uw.coins, 0) AS coins,
-                   COALESCE(c.total, 0) AS total_cards
-            FROM (
-                SELECT user_id FROM collection
-                UNION
-                SELECT user_id FROM user_wallet
-            ) u
-            LEFT JOIN user_wallet uw ON u.user_id = uw.user_id
-            LEFT JOIN (
-                SELECT user_id, COUNT(*) AS total FROM collection GROUP BY user_id
-            ) c ON u.user_id = c.user_id
-            ORDER BY coins DESC, total_cards DESC
-            LIMIT 10
-        """)
-        rows = await cursor.fetchall()
+    rows = await richest.top()
     if not rows:
         return await ctx.send("No collection or wallet data yet!")
     embed = discord.Embed(title="💰 Richest Collectors", color=discord.Color.gold())
-    for i, (user_id, coins, total_cards) in enumerate(rows, start=1):
-        try:
-            user = await bot.fetch_user(user_id)
-            name = user.display_name
-        except:
-            name = f"User ID {user_id}"
+    # gateway cache first, then at most one (deduplicated) fetch per unknown user
+    names = await users.display_names([row[0] for row in rows], guild=ctx.guild)
+    for i, ((user_id, coins, total_cards), name) in enumerate(zip(rows, names), start=1):
         embed.add_field(name=f"{i}. {name}", value=f"Coins: 💵 {coins} | Cards: {total_cards}", inline=False)
     await ctx.send(embed=embed)
 
 
+RELEASE_COINS = 5  # per released card
+RELEASE_USAGE = "❌ Use `!r <number>`, `!r <from>-<to>`, `!r rarity:<Rarity>` or `!r duplicates keep-best`."
+
+def parse_release(text):
+    """("slot", n) | ("range", lo, hi) | ("rarity", name) | ("duplicates",), or None if not understood."""
+    text = " ".join(text.lower().split())
+    if text.isdigit():
+        return ("slot", int(text))
+    m = re.fullmatch(r"(\d+) ?- ?(\d+)", text)
+    if m:
+        lo, hi = sorted((int(m.group(1)), int(m.group(2))))
+        return ("range", max(lo, 1), hi)
+    m = re.fullmatch(r"rarity ?: ?(\w+)", text)
+    if m:
+        rarity = next((name for name in RARITY_WEIGHTS if name.lower() == m.group(1)), None)
+        return ("rarity", rarity) if rarity else None
+    if text in ("duplicates", "duplicates keep-best", "dupes", "dupes keep-best"):
+        return ("duplicates",)
+    return None
+
 @bot.command()
-async def r(ctx, index: int):
+async def r(ctx, *, selection: str):
+    """Release characters for 5 coins each: one by number, a range, a rarity or duplicates."""
+    parsed = parse_release(selection)
+    if parsed is None:
+        return await ctx.send(RELEASE_USAGE)
+    if parsed[0] == "slot":
+        return await release_one(ctx, parsed[1])
+    await release_many(ctx, parsed)
+
+async def release_many(ctx, selection):
+    """Bulk release: one preview query, one confirmation, then one DELETE + one wallet update."""
+    # The ROWIDs shown in the preview are exactly what gets deleted: slots can shift while
+    # the prompt is open (a !r or !cc elsewhere), and a re-run selection could then hit
+    # cards the user never approved
+    cards = await selection_cards(storage, ctx.author.id, selection)
+    if not cards:
+        return await ctx.send("📦 No characters in your collection match that.")
+    count = len(cards)
+    if selection[0] == "range":
+        what = f"slots {selection[1]}-{selection[2]}"
+    elif selection[0] == "rarity":
+        what = f"all your {selection[1]} characters"
+    else:
+        what = "every duplicate (keeping your best copy of each character)"
+    breakdown = ", ".join(f"{RARITY_EMOJIS.get(rarity, '')} {rarity} ×{n}".strip() for rarity, n in selection_summary(cards))
+    confirmed = await confirmations.ask(
+        ctx, ctx.author.id,
+        f"{ctx.author.mention}, release {what}: **{count}** characters ({breakdown}) for 💵 {count * RELEASE_COINS} coins? "
+        "**This cannot be undone!** Press a button or reply `yes` (`y`) / `no` (`n`). You have 30 seconds.",
+    )
+    if confirmed is None:
+        return await ctx.send("⌛ No response. Release cancelled.")
+    if not confirmed:
+        return await ctx.send("❌ Release cancelled.")
+    async with storage.transaction() as db:
+        # cards released or cleared meanwhile are skipped and not paid for
+        released = await delete_cards(db, ctx.author.id, [rowid for rowid, _ in cards])
+        if released:
+            await db.execute(
+                "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + excluded.coins",
+                (ctx.author.id, released * RELEASE_COINS)
+            )
+    if not released:
+        return await ctx.send("📦 Those characters are no longer in your collection.")
+    await ctx.send(f"💔 You released **{released}** characters and earned 💵 {released * RELEASE_COINS} coins.")
+
+async def release_one(ctx, index):
     """Release a character from your collection by its index and earn 5 coins."""
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute("SELECT ROWID, character_name, rarity FROM collection WHERE user_id = ?", (ctx.author.id,))
-        rows = await cursor.fetchall()
-        if not rows:
+    card = await get_card(storage, ctx.author.id, index)
+    if not card:
+        total = await card_count(storage, ctx.author.id)
+        if not total:
             return await ctx.send("📦 Your collection is empty.")
-        if index < 1 or index > len(rows):
-            return await ctx.send(f"❌ Invalid number. You have {len(rows)} characters.")
-        row = rows[index-1]
-        rowid = row[0]
-        char_name = row[1]
-        rarity = row[2]
-        
-        # Ask for confirmation
-        emoji = RARITY_EMOJIS.get(rarity, "")
-        await ctx.send(f"{ctx.author.mention}, are you sure you want to release **{emoji} {char_name}** (Rarity: {rarity})? Reply with `yes` (or `y`) to confirm, or `no` (or `n`) to cancel. You have 30 seconds.")
-        
-        def check_msg(m):
-            return m.author.id == ctx.author.id and m.channel == ctx.channel and m.content.lower() in ("yes", "no", "y", "n")
-        
-        try:
-            msg = await bot.wait_for("message", timeout=30.0, check=check_msg)
-            resp = msg.content.lower()
-            if resp in ("yes", "y"):
-                # Delete the character
-                async with aiosqlite.connect("anime.db") as db:
-                    await db.execute("DELETE FROM collection WHERE ROWID = ?", (rowid,))
-                    # Award 5 coins
-                    await db.execute(
-                        "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + 5",
-                        (ctx.author.id, 5)
-                    )
-                    await db.commit()
-                await ctx.send(f"💔 You released **{emoji} {char_name}** and earned 💵 5 coins.")
-            else:
-                await ctx.send("❌ Release cancelled.")
-        except asyncio.TimeoutError:
-            await ctx.send("⌛ No response. Release cancelled.")
+        return await ctx.send(f"❌ Invalid number. You have {total} characters.")
+    rowid = card["rowid"]
+    char_name = card["name"]
+    rarity = card["rarity"]
+    
+    # Ask for confirmation
+    emoji = RARITY_EMOJIS.get(rarity, "")
+    confirmed = await confirmations.ask(ctx, ctx.author.id, f"{ctx.author.mention}, are you sure you want to release **{emoji} {char_name}** (Rarity: {rarity})? Press a button or reply `yes` (`y`) / `no` (`n`). You have 30 seconds.")
+    if confirmed is None:
+        await ctx.send("⌛ No response. Release cancelled.")
+    elif confirmed:
+        # Delete the character
+        async with storage.transaction() as db:
+            if not await delete_card(db, rowid):
+                return await ctx.send("❌ That character is no longer in your collection.")
+            # Award 5 coins
+            await db.execute(
+                "INSERT INTO user_wallet (user_id, coins) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET coins = coins + 5",
+                (ctx.author.id, 5)
+            )
+        await ctx.send(f"💔 You released **{emoji} {char_name}** and earned 💵 5 coins.")
+    else:
+        await ctx.send("❌ Release cancelled.")
 
 # -------------------- SPAWN --------------------
 @bot.command()
 async def spawn(ctx):
-    global spawned_character, spawn_channel, message_counter
     if ctx.author.id != OWNER_ID:
         return await ctx.send("❌ You are not allowed to use this command!")
     spawned_character = random_character()
-    spawn_channel = ctx.channel
-    message_counter = 0
+    await state.spawn_set(ctx.channel.id, spawned_character)
+    schedule_despawn(ctx.channel, spawned_character)
+    metrics.spawns.inc(spawned_character["rarity"], "forced")
     embed = create_spawn_embed(spawned_character)
     # Add forced spawn note to description
     embed.description = f"**(Forced Spawn)**\n\n{embed.description}"
-    image_path = get_character_image(spawned_character["name"])
-    if os.path.exists(image_path):
-        composed = _compose_spawn_image(image_path, spawned_character.get("rarity"))
-        if composed:
-            fname = "spawn.gif" if spawned_character.get("rarity") in ("Legendary","Mythic") else "spawn.png"
-            await spawn_channel.send(file=discord.File(fp=composed, filename=fname), embed=embed)
-        else:
-            file = discord.File(image_path, filename="character.png")
-            embed.set_image(url="attachment://character.png")
-            await spawn_channel.send(file=file, embed=embed)
-    else:
-        await spawn_channel.send(embed=embed)
+    await send_spawn(ctx.channel, spawned_character, embed)
 
 # -------------------- 1v1 BATTLE --------------------
 @bot.command()
 async def battle(ctx, opponent: discord.Member):
     if ctx.author.id == opponent.id:
         return await ctx.send("❌ You cannot battle yourself!")
-    if ctx.author.id in current_battles or opponent.id in current_battles:
+    if await state.battle_get(ctx.author.id) or await state.battle_get(opponent.id):
         return await ctx.send("❌ One of the players is already in a battle!")
     msg = await ctx.send(f"⚔️ {ctx.author.mention} has challenged {opponent.mention}! React ✅ to accept or ❌ to decline.")
+    # The answer arrives through on_raw_reaction_add; the timeout rides the shared timer wheel
+    timeout = timers.schedule(CHALLENGE_TIMEOUT, challenge_expired, ctx.channel, msg.id)
+    pending_challenges[msg.id] = (ctx.author.id, opponent.id, timeout)
     await msg.add_reaction("✅")
     await msg.add_reaction("❌")
 
-    def check(reaction, user):
-        return user.id == opponent.id and str(reaction.emoji) in ["✅","❌"] and reaction.message.id == msg.id
-
-    try:
-        reaction, user = await bot.wait_for("reaction_add", timeout=60.0, check=check)
-        if str(reaction.emoji) == "❌":
-            return await ctx.send("❌ Battle declined.")
-        await ctx.send("✅ Battle accepted! Starting...")
-        # Both players choose character
-        current_battles[ctx.author.id] = {"opponent_id": opponent.id, "stage": "choose", "choices":{}}
-        current_battles[opponent.id] = {"opponent_id": ctx.author.id, "stage": "choose", "choices":{}}
-        await ctx.send(f"{ctx.author.mention} and {opponent.mention}, pick your fighter using `!fight <index>` from your collection.")
-    except:
-        await ctx.send("❌ Battle request timed out.")
+@bot.event
+async def on_raw_reaction_add(payload):
+    challenge = pending_challenges.get(payload.message_id)
+    if challenge is None or payload.user_id != challenge[1] or str(payload.emoji) not in ("✅", "❌"):
+        return
+    del pending_challenges[payload.message_id]
+    challenger_id, opponent_id, timeout = challenge
+    timeout.cancel()
+    channel = bot.get_channel(payload.channel_id)
+    if channel is None:
+        return
+    if str(payload.emoji) == "❌":
+        return await channel.send("❌ Battle declined.")
+    # Both players choose character; re-checked atomically since either may have joined another battle meanwhile
+    if not await state.battle_start(challenger_id, opponent_id):
+        return await channel.send("❌ One of the players is already in a battle!")
+    pick_timers[pick_key(challenger_id, opponent_id)] = timers.schedule(PICK_TIMEOUT, pick_expired, channel, challenger_id, opponent_id)
+    await channel.send("✅ Battle accepted! Starting...")
+    await channel.send(f"{users.mention(challenger_id)} and {users.mention(opponent_id)}, pick your fighter using `!fight <index>` from your collection.")
 
 @bot.command()
 async def fight(ctx, index: int):
-    if ctx.author.id not in current_battles:
+    battle = await state.battle_get(ctx.author.id)
+    if not battle:
         return await ctx.send("❌ You are not in a battle.")
-    battle = current_battles[ctx.author.id]
     if battle["stage"] != "choose":
         return await ctx.send("❌ You already chose your fighter or battle not started.")
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute(
-            "SELECT ROWID, user_id, character_name, anime, rarity, hp, attack, defense, speed, iv, COALESCE(level,1) as level, COALESCE(exp,0) as exp FROM collection WHERE user_id = ?",
-            (ctx.author.id,)
-        )
-        rows = await cursor.fetchall()
-    if not rows or index < 1 or index > len(rows):
+    # card dict: rowid, user_id, name, anime, rarity, hp, attack, defense, speed, iv, level, exp, slot
+    chosen = await get_card(storage, ctx.author.id, index)
+    if not chosen:
         return await ctx.send("❌ Invalid index.")
-    row = rows[index-1]
-    # map row to dict for clarity: ROWID, user_id, character_name, anime, rarity, hp, attack, defense, speed, iv, level, exp
-    chosen = {
-        "rowid": row[0],
-        "user_id": row[1],
-        "name": row[2],
-        "anime": row[3],
-        "rarity": row[4],
-        "hp": row[5],
-        "attack": row[6],
-        "defense": row[7],
-        "speed": row[8],
-        "iv": row[9],
-        "level": row[10],
-        "exp": row[11]
-    }
-    battle["choices"][ctx.author.id] = chosen
+    # Stored in both players' battle records; completing the pair moves the battle to "fighting"
+    battle = await state.battle_choose(ctx.author.id, chosen)
+    if battle is None:
+        return await ctx.send("❌ You already chose your fighter or battle not started.")
     await ctx.send(f"{ctx.author.mention} picked {chosen['name']}!")
-    # Mirror choice into opponent's battle dict so both sides can see choices
-    opp_id = battle["opponent_id"]
-    if opp_id in current_battles:
-        current_battles[opp_id]["choices"][ctx.author.id] = chosen
 
     # If opponent already picked, start battle
+    opp_id = battle["opponent_id"]
     if opp_id in battle["choices"]:
-        await start_battle(ctx, ctx.author.id, opp_id)
-
-def _compose_battle_image(p1_path, p2_path, p1_name, p1_hp, p1_max, p2_name, p2_hp, p2_max, p1_rarity=None, p2_rarity=None):
-    """Return a BytesIO PNG of two styled character cards side-by-side with health bars above each.
-
-    Adds rounded portraits, rarity-colored frames, level badges and nicer fonts when Pillow is available.
-    """
-    if Image is None:
-        return None
-    try:
-        def load_or_placeholder(path):
-            if path and os.path.exists(path):
-                img = Image.open(path).convert("RGBA")
-            else:
-                img = Image.new("RGBA", (320, 320), (90,90,90,255))
-            return img
-
-        img1 = load_or_placeholder(p1_path)
-        img2 = load_or_placeholder(p2_path)
+        cancel_pick_timeout(ctx.author.id, opp_id)
+        await start_battle(ctx, ctx.author.id, opp_id, battle["choices"])
 
-        # target heights
-        target_h = 260
-        def resize_to_height(img, h):
-            w, _ = img.size
-            new_w = int(w * (h / img.size[1]))
-            return img.resize((new_w, h))
-
-        img1 = resize_to_height(img1, target_h)
-        img2 = resize_to_height(img2, target_h)
-
-        padding = 28
-        bar_h = 30
-
-        # font: prefer Arial, fallback to default
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-            font_bold = ImageFont.truetype("arialbd.ttf", 18)
-        except Exception:
-            font = ImageFont.load_default()
-            font_bold = font
-
-        # rarity colors
-        rc = {"Common": (120,120,120), "Rare": (30,144,255), "Epic": (147,112,219), "Legendary": (138,43,226), "Mythic": (255,215,0)}
-        col1 = rc.get(p1_rarity, (80,80,80))
-        col2 = rc.get(p2_rarity, (80,80,80))
-
-        canvas_w = img1.width + img2.width + padding * 3
-        canvas_h = target_h + bar_h + 70
-        canvas = Image.new("RGBA", (canvas_w, canvas_h), (34,36,40,255))
-        draw = ImageDraw.Draw(canvas)
-
-        x1 = padding
-        x2 = padding * 2 + img1.width
-
-        # helper: rounded mask
-        def rounded(img, radius=30):
-            mask = Image.new('L', img.size, 0)
-            drawm = ImageDraw.Draw(mask)
-            drawm.rounded_rectangle([0,0,img.size[0],img.size[1]], radius=radius, fill=255)
-            out = Image.new('RGBA', img.size, (0,0,0,0))
-            out.paste(img, (0,0), mask)
-            return out
-
-        rim = 6
-        r1 = rounded(img1, radius=24)
-        r2 = rounded(img2, radius=24)
-
-        # draw health bar function with nicer style
-        def draw_health_bar(x, y, width, hp, hp_max, color):
-            # background bar
-            draw.rounded_rectangle([x, y, x+width, y+bar_h], radius=12, fill=(60,60,60,255))
-            ratio = max(0.0, min(1.0, hp / max(1, hp_max)))
-            filled = int(width * ratio)
-            fill_color = color if isinstance(color, tuple) else (80,200,120)
-            draw.rounded_rectangle([x, y, x+filled, y+bar_h], radius=12, fill=fill_color)
-            # text
-            txt = f"{hp}/{hp_max}"
-            tw, th = draw.textsize(txt, font=font_bold)
-            draw.text((x+width - tw - 8, y + (bar_h-th)//2), txt, font=font_bold, fill=(255,255,255,255))
-
-        # draw bars above images
-        draw_health_bar(x1, 10, img1.width, p1_hp, p1_max, col1)
-        draw_health_bar(x2, 10, img2.width, p2_hp, p2_max, col2)
-
-        # paste framed images with border
-        # border rectangles
-        draw.rounded_rectangle([x1-rim, 10+bar_h+8-rim, x1+img1.width+rim, 10+bar_h+8+img1.height+rim], radius=26, outline=col1+(200,), width=4)
-        draw.rounded_rectangle([x2-rim, 10+bar_h+8-rim, x2+img2.width+rim, 10+bar_h+8+img2.height+rim], radius=26, outline=col2+(200,), width=4)
-
-        canvas.paste(r1, (x1, 10 + bar_h + 8), r1)
-        canvas.paste(r2, (x2, 10 + bar_h + 8), r2)
-
-        # level badges (use small circles)
-        def draw_level_badge(cx, cy, lvl, color):
-            badge_r = 18
-            draw.ellipse([cx-badge_r, cy-badge_r, cx+badge_r, cy+badge_r], fill=color)
-            lvtxt = str(lvl)
-            tw, th = draw.textsize(lvtxt, font=font_bold)
-            draw.text((cx - tw/2, cy - th/2), lvtxt, font=font_bold, fill=(0,0,0,255))
-
-        # attempt to position badges top-left of each portrait
-        draw_level_badge(x1+26, 10 + bar_h + 8 + 26, 1, col1)
-        draw_level_badge(x2+26, 10 + bar_h + 8 + 26, 1, col2)
-
-        # draw names under images
-        n1y = 10 + bar_h + 8 + img1.height + 6
-        n2y = 10 + bar_h + 8 + img2.height + 6
-        draw.text((x1, n1y), p1_name, font=font_bold, fill=(255,255,255,255))
-        draw.text((x2, n2y), p2_name, font=font_bold, fill=(255,255,255,255))
-
-        bio = io.BytesIO()
-        canvas.save(bio, format="PNG")
-        bio.seek(0)
-        return bio
-    except Exception:
-        return None
-
-async def start_battle(ctx, player1_id, player2_id):
-    p1 = current_battles[player1_id]["choices"][player1_id]
-    p2 = current_battles[player2_id]["choices"][player2_id]
+async def start_battle(ctx, player1_id, player2_id, choices):
+    p1 = choices[player1_id]
+    p2 = choices[player2_id]
 
     p1_hp, p2_hp = p1["hp"], p2["hp"]
     turn = 0
@@ -667,16 +760,17 @@ async def start_battle(ctx, player1_id, player2_id):
         f"{p2['name']} — Level {p2.get('level',1)} | Speed: {p2.get('speed',0)}\n"
     )
 
-    image_p1 = get_character_image(p1["name"]) if p1.get("name") else None
-    image_p2 = get_character_image(p2["name"]) if p2.get("name") else None
-    composed = None
-    if Image is not None:
-        composed = _compose_battle_image(
-            image_p1 if image_p1 and os.path.exists(image_p1) else None,
-            image_p2 if image_p2 and os.path.exists(image_p2) else None,
-            p1["name"], p1_hp, p1["hp"], p2["name"], p2_hp, p2["hp"],
-            p1.get("rarity"), p2.get("rarity")
-        )
+    # 260px-tall portrait variants: far less for the worker to decode than the source PNGs
+    image_p1 = art_path(p1["name"], "portrait") if p1.get("name") else None
+    image_p2 = art_path(p2["name"], "portrait") if p2.get("name") else None
+    # Rendered in a worker process; None when the render queue is saturated
+    composed = await render_service.submit(
+        _compose_battle_image,
+        image_p1,
+        image_p2,
+        p1["name"], p1_hp, p1["hp"], p2["name"], p2_hp, p2["hp"],
+        p1.get("rarity"), p2.get("rarity")
+    )
 
     # initial embed with ascii health bars and polished styling
     rarity_color_p1 = {"Common": discord.Color.greyple(), "Rare": discord.Color.blue(), "Epic": discord.Color.purple(), "Legendary": discord.Color.from_rgb(138, 43, 226), "Mythic": discord.Color.gold()}
@@ -688,10 +782,10 @@ async def start_battle(ctx, player1_id, player2_id):
     else:
         # Fallback: send individual character images
         files_to_send = []
-        if image_p1 and os.path.exists(image_p1):
-            files_to_send.append(discord.File(image_p1, filename="char1.png"))
-        if image_p2 and os.path.exists(image_p2):
-            files_to_send.append(discord.File(image_p2, filename="char2.png"))
+        if image_p1:
+            files_to_send.append(discord.File(image_p1, filename="char1" + os.path.splitext(image_p1)[1]))
+        if image_p2:
+            files_to_send.append(discord.File(image_p2, filename="char2" + os.path.splitext(image_p2)[1]))
         if files_to_send:
             await ctx.send(files=files_to_send)
     
@@ -703,140 +797,77 @@ async def start_battle(ctx, player1_id, player2_id):
 
     battle_msg = await ctx.send(embed=embed)
 
-    # Main loop: edit battle_msg each turn instead of sending new messages
-    while p1_hp > 0 and p2_hp > 0:
-        attacker, defender = (p1, p2) if turn % 2 == 0 else (p2, p1)
-        damage = max(1, attacker["attack"] - defender["defense"])  # simple damage = attack - defense
-        # compute target HPs
+    # The whole fight is computed up front; below we only replay its turn log
+    result = simulate_battle(p1, p2)
+
+    # Build the animation timeline: 3 interpolated health-bar frames 0.1s apart, then the
+    # round's final bars + action line, then a 1s pause. State = (round, p1_hp, p2_hp, action)
+    timeline = []
+    t = 0.0
+    steps = 3
+    for step in result.turns:
+        attacker, defender = (p1, p2) if step.attacker == 0 else (p2, p1)
+        damage = step.damage
         if attacker is p1:
-            prev_hp = p2_hp
-            target_hp = max(p2_hp - damage, 0)
+            prev_hp, target_hp = p2_hp, step.p2_hp
         else:
-            prev_hp = p1_hp
-            target_hp = max(p1_hp - damage, 0)
-
-        # animate ASCII health bar in 3 frames to smooth the transition
-        steps = 3
+            prev_hp, target_hp = p1_hp, step.p1_hp
         for s in range(steps):
-            inter_hp = prev_hp - math.ceil((s+1) * (damage / steps))
-            inter_hp = max(inter_hp, target_hp)
-            if attacker is p1:
-                f1 = hp_bar(p1_hp, p1["hp"])
-                f2 = hp_bar(inter_hp, p2["hp"])
-                embed.clear_fields()
-                embed.add_field(name=f"⚔️ {p1['name']} (Lvl {p1.get('level',1)})", value=f1, inline=True)
-                embed.add_field(name=f"⚔️ {p2['name']} (Lvl {p2.get('level',1)})", value=f2, inline=True)
-            else:
-                f1 = hp_bar(inter_hp, p1["hp"])
-                f2 = hp_bar(p2_hp, p2["hp"])
-                embed.clear_fields()
-                embed.add_field(name=f"⚔️ {p1['name']} (Lvl {p1.get('level',1)})", value=f1, inline=True)
-                embed.add_field(name=f"⚔️ {p2['name']} (Lvl {p2.get('level',1)})", value=f2, inline=True)
-
-            # update round header and stats in description
-            embed.description = f"**(Round {turn+1})**\n" + stats_block
-            await battle_msg.edit(embed=embed)
-            await asyncio.sleep(0.1)
-
-        # apply final hp after animation
-        if attacker is p1:
-            p2_hp = target_hp
-        else:
-            p1_hp = target_hp
-
-        # update action log to footer and final health bars AT THE SAME TIME
+            inter_hp = max(prev_hp - math.ceil((s+1) * (damage / steps)), target_hp)
+            frame = (step.round, p1_hp, inter_hp, None) if attacker is p1 else (step.round, inter_hp, p2_hp, None)
+            timeline.append((t, frame))
+            t += 0.1
+        p1_hp, p2_hp = step.p1_hp, step.p2_hp
         action_line = f"💥 {attacker['name']} attacks → {damage} damage to {defender['name']}!"
-        embed.set_footer(text=action_line)
-        emoji1 = RARITY_EMOJIS.get(p1.get("rarity", "Common"), "")
-        emoji2 = RARITY_EMOJIS.get(p2.get("rarity", "Common"), "")
+        timeline.append((t, (step.round, p1_hp, p2_hp, action_line)))
+        t += 1.0
+
+    emoji1 = RARITY_EMOJIS.get(p1.get("rarity", "Common"), "")
+    emoji2 = RARITY_EMOJIS.get(p2.get("rarity", "Common"), "")
+    footer = ["Animating battle... health bars updating"]
+
+    def render_frame(state, covered):
+        rnd, h1, h2, action = state
+        # when the channel is behind, several rounds land in one edit: show their latest actions
+        actions = [c[3] for c in covered if c[3]]
+        if actions:
+            footer[0] = "\n".join(actions[-3:])
+        embed.description = f"**(Round {rnd})**\n" + stats_block
+        embed.set_footer(text=footer[0])
         embed.clear_fields()
-        embed.add_field(name=f"{emoji1} {p1['name']} (Lvl {p1.get('level',1)})", value=hp_bar(p1_hp, p1["hp"]), inline=True)
-        embed.add_field(name=f"{emoji2} {p2['name']} (Lvl {p2.get('level',1)})", value=hp_bar(p2_hp, p2["hp"]), inline=True)
-        await battle_msg.edit(embed=embed)
+        # rarity emoji on settled frames, crossed swords while bars are moving
+        icon1, icon2 = (emoji1, emoji2) if action else ("⚔️", "⚔️")
+        embed.add_field(name=f"{icon1} {p1['name']} (Lvl {p1.get('level',1)})", value=hp_bar(h1, p1["hp"]), inline=True)
+        embed.add_field(name=f"{icon2} {p2['name']} (Lvl {p2.get('level',1)})", value=hp_bar(h2, p2["hp"]), inline=True)
+        return embed
 
-        # small pause before next round
-        await asyncio.sleep(1.0)
-        turn += 1
+    # Edits are paced by the per-channel/global edit budget, dropping frames when behind
+    await animator.play(battle_msg, ctx.channel.id, timeline, render_frame)
 
-    winner = p1 if p1_hp > 0 else p2
+    winner = p1 if result.winner == 0 else p2
     loser = p2 if winner is p1 else p1
     
-    # Get user objects for pinging
-    try:
-        winner_user = await bot.fetch_user(winner["user_id"]) if winner.get("user_id") else None
-        winner_name = winner_user.mention if winner_user else f"User {winner.get('user_id')}"
-    except:
-        winner_name = f"User {winner.get('user_id')}"
-    
-    try:
-        loser_user = await bot.fetch_user(loser["user_id"]) if loser.get("user_id") else None
-        loser_name = loser_user.mention if loser_user else f"User {loser.get('user_id')}"
-    except:
-        loser_name = f"User {loser.get('user_id')}"
+    # Mentions render client-side from the id, so no user lookup is needed for pinging
+    winner_name = users.mention(winner["user_id"]) if winner.get("user_id") else f"User {winner.get('user_id')}"
+    loser_name = users.mention(loser["user_id"]) if loser.get("user_id") else f"User {loser.get('user_id')}"
     
     await ctx.send(f"🏆 Battle Over!\n{winner_name} wins and {loser_name} loses")
 
-    # Award XP: character and user
-    char_xp = 20
-    user_xp = 10
-    # bonus by rarity
-    rarity_bonus = {"Common": 0, "Rare": 5, "Epic": 10, "Legendary": 20, "Mythic": 40}
-    char_xp += rarity_bonus.get(winner.get("rarity", "Common"), 0)
-
-    async with aiosqlite.connect("anime.db") as db:
-        # update character exp and level for winner character (collection)
-        # fetch current exp/level for safety
-        await db.execute("UPDATE collection SET exp = COALESCE(exp,0) + ? WHERE ROWID = ?", (char_xp, winner["rowid"]))
-        cursor = await db.execute("SELECT COALESCE(level,1), COALESCE(exp,0) FROM collection WHERE ROWID = ?", (winner["rowid"],))
-        crow = await cursor.fetchone()
-        if crow:
-            clevel, cexp = crow[0], crow[1]
-            leveled = 0
-            while cexp >= clevel * 100:
-                cexp -= clevel * 100
-                clevel += 1
-                leveled += 1
-            if leveled > 0:
-                await db.execute("UPDATE collection SET level = ?, exp = ? WHERE ROWID = ?", (clevel, cexp, winner["rowid"]))
-            else:
-                await db.execute("UPDATE collection SET exp = ? WHERE ROWID = ?", (cexp, winner["rowid"]))
-
-        # update user_profile for winner user
-        # First ensure user exists
-        await db.execute("INSERT OR IGNORE INTO user_profile (user_id, level, exp) VALUES (?, 1, 0)", (winner["user_id"],))
-        # Then update exp
-        await db.execute("UPDATE user_profile SET exp = exp + ? WHERE user_id = ?", (user_xp, winner["user_id"]))
-        cursor = await db.execute("SELECT level, exp FROM user_profile WHERE user_id = ?", (winner["user_id"],))
-        urow = await cursor.fetchone()
-        if urow:
-            ulevel, uexp = urow[0], urow[1]
-            u_leveled = 0
-            while uexp >= ulevel * 100:
-                uexp -= ulevel * 100
-                ulevel += 1
-                u_leveled += 1
-            if u_leveled > 0:
-                await db.execute("UPDATE user_profile SET level = ?, exp = ? WHERE user_id = ?", (ulevel, uexp, winner["user_id"]))
-            else:
-                await db.execute("UPDATE user_profile SET exp = ? WHERE user_id = ?", (uexp, winner["user_id"]))
-
-        await db.commit()
+    # Award XP: character and user, in one transaction
+    char_xp, user_xp = await award_battle(storage, winner)
 
     # Inform about XP gains with clean format
     await ctx.send(f"✨ XP Gained:\n{winner['name']} → {char_xp} Char XP +{user_xp} User XP")
 
     # Clean up
-    del current_battles[player1_id]
-    del current_battles[player2_id]
+    await state.battle_end(player1_id, player2_id)
 
 @bot.command()
 async def bal(ctx):
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute(
-            "SELECT coins FROM user_wallet WHERE user_id = ?",
-            (ctx.author.id,)
-        )
-        row = await cursor.fetchone()
+    row = await storage.fetchone(
+        "SELECT coins FROM user_wallet WHERE user_id = ?",
+        (ctx.author.id,)
+    )
     coins = row[0] if row else 0
     embed = discord.Embed(title="💰 Wallet", description=f"**{ctx.author.display_name}**'s Balance", color=discord.Color.gold())
     embed.add_field(name="Coins", value=f"💵 {coins}")
@@ -844,12 +875,10 @@ async def bal(ctx):
 
 @bot.command()
 async def profile(ctx):
-    async with aiosqlite.connect("anime.db") as db:
-        cursor = await db.execute(
-            "SELECT COALESCE(level,1), COALESCE(exp,0) FROM user_profile WHERE user_id = ?",
-            (ctx.author.id,)
-        )
-        row = await cursor.fetchone()
+    row = await storage.fetchone(
+        "SELECT COALESCE(level,1), COALESCE(exp,0) FROM user_profile WHERE user_id = ?",
+        (ctx.author.id,)
+    )
     level = row[0] if row else 1
     exp = row[1] if row else 0
     embed = discord.Embed(title="👤 Profile", description=f"**{ctx.author.display_name}**'s Stats", color=discord.Color.purple())
@@ -875,7 +904,7 @@ async def commands(ctx):
         value=(
             "`!acatch <name>` / `!ac` - Catch spawned character (+25 coins)\n"
             "`!hint` - Get a hint for character name\n"
-            "`!collection` - View all your characters\n"
+            "`!collection [page]` - Browse your characters\n"
             "`!info <idx>` - View character details & stats\n"
             "`!cc` - Clear collection (confirmation required)"
         ),
@@ -907,7 +936,7 @@ async def commands(ctx):
     # Release
     embed.add_field(
         name="💔 **Release Characters**",
-        value="`!r <idx>` - Release character (+5 coins, requires confirmation)",
+        value="`!r <idx>` - Release character (+5 coins, requires confirmation)\n`!r 3-40` / `!r rarity:Common` / `!r duplicates keep-best` - Release in bulk",
         inline=False
     )
     
@@ -928,30 +957,164 @@ async def commands(ctx):
 @bot.command()
 async def lock(ctx):
     """Lock the bot (only usable by admin)."""
-    global bot_locked
     if ctx.author.id != OWNER_ID:
         return await ctx.send("❌ You are not allowed to use this command!")
-    bot_locked = True
+    await state.set_locked(True)
     await ctx.send("🔒 Bot is now **locked**. Only you can use commands.")
 
 @bot.command()
 async def unlock(ctx):
     """Unlock the bot (only usable by admin)."""
-    global bot_locked
     if ctx.author.id != OWNER_ID:
         return await ctx.send("❌ You are not allowed to use this command!")
-    bot_locked = False
+    await state.set_locked(False)
     await ctx.send("🔓 Bot is now **unlocked**. Everyone can use commands.")
 
+@bot.command()
+async def dbstats(ctx, top: int = 10):
+    """Show where database time is going (only usable by admin)."""
+    if ctx.author.id != OWNER_ID:
+        return await ctx.send("❌ You are not allowed to use this command!")
+    timings = storage.timings()[:max(1, min(top, 20))]
+    if not timings:
+        return await ctx.send("No queries recorded yet.")
+    embed = discord.Embed(title="🗄️ Query Timings", color=discord.Color.dark_teal())
+    for sql, count, total_ms, avg_ms, max_ms in timings:
+        short = sql if len(sql) <= 200 else sql[:197] + "..."
+        embed.add_field(name=f"{total_ms:.1f} ms total | {count}x | avg {avg_ms:.2f} ms | max {max_ms:.2f} ms", value=f"`{short}`", inline=False)
+    await ctx.send(embed=embed)
+
+@bot.command()
+async def renderstats(ctx):
+    """Show render queue, cache and animation stats (only usable by admin)."""
+    if ctx.author.id != OWNER_ID:
+        return await ctx.send("❌ You are not allowed to use this command!")
+    st = render_service.stats()
+    cache = spawn_cache.stats()
+    embed = discord.Embed(title="🖼️ Render Service", color=discord.Color.dark_teal())
+    embed.add_field(name="Queue", value=f"Depth: {st['queue_depth']} (peak {st['peak_queue_depth']}) / {render_service.max_pending}", inline=False)
+    embed.add_field(name="Latency", value=f"p50 {st['p50_ms']:.0f} ms | p95 {st['p95_ms']:.0f} ms | max {st['max_ms']:.0f} ms", inline=False)
+    embed.add_field(name="Jobs", value=f"Done: {st['completed']} | Rejected: {st['rejected']} | Timed out: {st['timeouts']} | Failed: {st['failures']}", inline=False)
+    embed.add_field(name="Spawn cache", value=f"{cache['entries']} entries, {cache['bytes'] // 1024} KB | hits {cache['hits']} / disk {cache['disk_hits']} / renders {cache['misses']}", inline=False)
+    art = assets.stats()
+    embed.add_field(name="Asset store", value=f"{art['variants']} variants, {art['bytes'] // 1024} KB in memory" if assets.ready else "Building...", inline=False)
+    urls = cdn_urls.stats()
+    embed.add_field(name="CDN URL cache", value=f"{urls['urls']} URLs | reused {urls['hits']} / uploaded {urls['uploads']}", inline=False)
+    anim = animator.stats()
+    embed.add_field(name="Battle animations", value=f"Edits sent: {anim['sent']} | Frames dropped: {anim['dropped']} | Channels tracked: {anim['channels']}", inline=False)
+    await ctx.send(embed=embed)
+
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "5"))  # timestamped backups kept in backups/
+BACKUP_USAGE = "❌ Use `!backup` (or `!backup db`) or `!backup export [jsonl|csv]`."
+backup_running = False
+
+@bot.command(name="backup")
+async def backup_command(ctx, action: str = "db", fmt: str = "jsonl"):
+    """Snapshot the database while the bot keeps running (only usable by admin).
+
+    !backup                      - online copy to backups/
+    !backup export [jsonl|csv]   - stream the player tables to exports/<time>/
+    """
+    global backup_running
+    if ctx.author.id != OWNER_ID:
+        return await ctx.send("❌ You are not allowed to use this command!")
+    action, fmt = action.lower(), fmt.lower()
+    if action not in ("db", "export") or fmt not in EXPORT_FORMATS:
+        return await ctx.send(BACKUP_USAGE)
+    if backup_running:
+        return await ctx.send("❌ A backup is already running.")
+    backup_running = True
+    try:
+        if action == "export":
+            out_dir = os.path.join("exports", time.strftime("%Y%m%d-%H%M%S"))
+            await ctx.send(f"📤 Exporting player tables to `{out_dir}`...")
+            counts = await asyncio.to_thread(export_database, storage.path, out_dir, fmt)
+            summary = ", ".join(f"{table}: {rows}" for table, rows in counts.items())
+            return await ctx.send(f"✅ Export finished ({summary}).")
+        await ctx.send("💾 Backing up the database...")
+        # Runs in a thread on its own read-only connection; writers are never blocked
+        info = await asyncio.to_thread(backup_database, storage.path, backup_path(storage.path))
+        pruned = await asyncio.to_thread(prune_backups, storage.path, keep=BACKUP_KEEP)
+        await ctx.send(f"✅ Backup written to `{info['path']}` ({info['bytes'] / 1e6:.1f} MB in {info['seconds']:.1f}s)"
+                       + (f"; removed {len(pruned)} old backup(s)." if pruned else "."))
+    except Exception as e:
+        print(f"Backup failed: {e}")
+        await ctx.send(f"❌ Backup failed: {e}")
+    finally:
+        backup_running = False
+
+DIAG_USAGE = "❌ Use `!diag`, `!diag watch [ms]`, `!diag unwatch`, `!diag stalls [n]` or `!diag profile [sec] [all]`."
+
+@bot.command()
+async def diag(ctx, action: str = "status", arg: str = None, scope: str = None):
+    """Event-loop stall watchdog and sampling profiler (only usable by admin).
+
+    !diag                      - watchdog state and recent stalls
+    !diag watch [ms]           - start stall detection (default 250 ms)
+    !diag unwatch              - stop it
+    !diag stalls [n]           - stack dump of the last n stalls
+    !diag profile [sec] [all]  - sample the event loop (or every thread) and upload a folded-stack file
+    """
+    global profiling
+    if ctx.author.id != OWNER_ID:
+        return await ctx.send("❌ You are not allowed to use this command!")
+    action = action.lower()
+    try:
+        number = float(arg) if arg else None
+    except ValueError:
+        return await ctx.send(DIAG_USAGE)
+    if number is not None and not (number > 0 and math.isfinite(number)):
+        return await ctx.send(DIAG_USAGE)
+
+    if action == "watch":
+        threshold = number / 1000 if number else 0.25
+        watchdog.start(threshold)
+        return await ctx.send(f"🐢 Stall watchdog on: capturing stacks when the loop is blocked for > {watchdog.threshold * 1000:.0f} ms.")
+    if action == "unwatch":
+        watchdog.stop()
+        return await ctx.send("🐢 Stall watchdog off.")
+    if action == "stalls":
+        recent = list(watchdog.stalls)[-max(1, min(int(number or 5), 20)):]
+        if not recent:
+            return await ctx.send("No stalls recorded.")
+        report = "\n".join(
+            f"=== {time.strftime('%H:%M:%S', time.localtime(st['started']))} blocked {st['duration'] * 1000:.0f} ms ===\n{st['stack']}"
+            for st in recent
+        )
+        return await ctx.send(f"🐢 Last {len(recent)} stall(s):", file=discord.File(io.BytesIO(report.encode()), filename="stalls.txt"))
+    if action == "profile":
+        if profiling:
+            return await ctx.send("❌ A profile is already running.")
+        seconds = max(1.0, min(number or 10.0, 60.0))
+        threads = None if (scope or "").lower() == "all" else {threading.get_ident()}
+        await ctx.send(f"🔬 Sampling {'all threads' if threads is None else 'the event loop'} for {seconds:.0f}s...")
+        profiling = True
+        try:
+            folded = await asyncio.to_thread(sample_profile, seconds, 0.005, threads)
+        finally:
+            profiling = False
+        if not folded:
+            return await ctx.send("No samples collected.")
+        hot = "\n".join(f"`{frame}` - {count} samples" for frame, count in top_frames(folded))
+        return await ctx.send(
+            f"🔥 Hottest frames (self time):\n{hot}\nLoad the file into speedscope.app or flamegraph.pl.",
+            file=discord.File(io.BytesIO(folded.encode()), filename=f"profile-{int(time.time())}.folded"),
+        )
+
+    status = f"on (> {watchdog.threshold * 1000:.0f} ms)" if watchdog.running else "off"
+    lines = [f"Watchdog: {status} | stalls recorded: {len(watchdog.stalls)}"]
+    for st in list(watchdog.stalls)[-5:]:
+        leaf = st["stack"].strip().splitlines()[-2:-1] or ["?"]
+        lines.append(f"• {time.strftime('%H:%M:%S', time.localtime(st['started']))} {st['duration'] * 1000:.0f} ms at `{leaf[0].strip()}`")
+    await ctx.send("\n".join(lines))
+
 @bot.command()
 async def flee(ctx):
     """Flee from an ongoing battle (you lose and opponent wins)."""
-    global current_battles
-    
-    if ctx.author.id not in current_battles:
+    battle = await state.battle_get(ctx.author.id)
+    if not battle:
         return await ctx.send("❌ You are not in a battle!")
     
-    battle = current_battles[ctx.author.id]
     opponent_id = battle["opponent_id"]
     
     # Determine winner and loser
@@ -965,72 +1128,25 @@ async def flee(ctx):
     loser_char = battle["choices"][fleeing_user]
     winner_char = battle["choices"][winning_user]
     
-    # Get user objects for announcement
-    try:
-        fleeing_obj = await bot.fetch_user(fleeing_user)
-        fleeing_name = fleeing_obj.mention
-    except:
-        fleeing_name = f"User {fleeing_user}"
-    
-    try:
-        winner_obj = await bot.fetch_user(winning_user)
-        winner_name = winner_obj.mention
-    except:
-        winner_name = f"User {winning_user}"
+    # Mentions for the announcement (no user lookup needed)
+    fleeing_name = users.mention(fleeing_user)
+    winner_name = users.mention(winning_user)
     
     # Award XP to winner
-    char_xp = 20
-    user_xp = 10
-    rarity_bonus = {"Common": 0, "Rare": 5, "Epic": 10, "Legendary": 20, "Mythic": 40}
-    char_xp += rarity_bonus.get(winner_char.get("rarity", "Common"), 0)
-    
-    async with aiosqlite.connect("anime.db") as db:
-        # Update winner character exp and level
-        await db.execute("UPDATE collection SET exp = COALESCE(exp,0) + ? WHERE ROWID = ?", (char_xp, winner_char["rowid"]))
-        cursor = await db.execute("SELECT COALESCE(level,1), COALESCE(exp,0) FROM collection WHERE ROWID = ?", (winner_char["rowid"],))
-        crow = await cursor.fetchone()
-        if crow:
-            clevel, cexp = crow[0], crow[1]
-            leveled = 0
-            while cexp >= clevel * 100:
-                cexp -= clevel * 100
-                clevel += 1
-                leveled += 1
-            if leveled > 0:
-                await db.execute("UPDATE collection SET level = ?, exp = ? WHERE ROWID = ?", (clevel, cexp, winner_char["rowid"]))
-            else:
-                await db.execute("UPDATE collection SET exp = ? WHERE ROWID = ?", (cexp, winner_char["rowid"]))
-        
-        # Update winner user profile
-        await db.execute("INSERT OR IGNORE INTO user_profile (user_id, level, exp) VALUES (?, 1, 0)", (winning_user,))
-        await db.execute("UPDATE user_profile SET exp = exp + ? WHERE user_id = ?", (user_xp, winning_user))
-        cursor = await db.execute("SELECT level, exp FROM user_profile WHERE user_id = ?", (winning_user,))
-        urow = await cursor.fetchone()
-        if urow:
-            ulevel, uexp = urow[0], urow[1]
-            u_leveled = 0
-            while uexp >= ulevel * 100:
-                uexp -= ulevel * 100
-                ulevel += 1
-                u_leveled += 1
-            if u_leveled > 0:
-                await db.execute("UPDATE user_profile SET level = ?, exp = ? WHERE user_id = ?", (ulevel, uexp, winning_user))
-            else:
-                await db.execute("UPDATE user_profile SET exp = ? WHERE user_id = ?", (uexp, winning_user))
-        
-        await db.commit()
+    char_xp, user_xp = await award_battle(storage, winner_char)
     
     # Announce battle end
     await ctx.send(f"⚔️ **Battle Ended!**\n{fleeing_name} fled from battle!\n{winner_name} wins and {fleeing_name} loses")
     await ctx.send(f"✨ XP Gained:\n{winner_char['name']} → {char_xp} Char XP +{user_xp} User XP")
     
     # Clean up battles
-    del current_battles[fleeing_user]
-    if winning_user in current_battles:
-        del current_battles[winning_user]
+    cancel_pick_timeout(fleeing_user, winning_user)
+    await state.battle_end(fleeing_user, winning_user)
 
 
 import os
 
 TOKEN = os.getenv("DISCORD_TOKEN")
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    # Guarded so render worker processes can import this module without starting the bot
+    bot.run(TOKEN)
\ No newline at end of file
@@ -0,0 +1,171 @@
+# cards.py
+# Collection queries. Every card has a dense per-user `slot` (1..N, in catch order)
+# backed by idx_collection_user_slot, so "the Nth card" is a single index lookup and
+# the numbers shown by !collection are the ones !info / !r / !fight accept.
+
+import json
+
+from character import RARITY_WEIGHTS
+
+CARD_COLUMNS = "ROWID, user_id, character_name, anime, rarity, hp, attack, defense, speed, iv, COALESCE(level,1), COALESCE(exp,0), slot"
+
+
+def card_from_row(row):
+    return {
+        "rowid": row[0],
+        "user_id": row[1],
+        "name": row[2],
+        "anime": row[3],
+        "rarity": row[4],
+        "hp": row[5],
+        "attack": row[6],
+        "defense": row[7],
+        "speed": row[8],
+        "iv": row[9],
+        "level": row[10],
+        "exp": row[11],
+        "slot": row[12],
+    }
+
+
+async def ensure_slots(db):
+    """Number any unslotted cards and create the slot index (migration 3; the column must exist)."""
+    missing = await db.fetchone("SELECT 1 FROM collection WHERE slot IS NULL LIMIT 1")
+    if missing:
+        # one-off renumbering in existing ROWID (catch) order
+        await db.execute("""
+            UPDATE collection SET slot = numbered.n
+            FROM (SELECT ROWID AS rid, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY ROWID) AS n FROM collection) AS numbered
+            WHERE collection.ROWID = numbered.rid
+        """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_collection_user_slot ON collection(user_id, slot)")
+
+
+async def card_count(db, user_id):
+    """Number of cards a user owns (slots are dense, so this is MAX(slot) via the index)."""
+    row = await db.fetchone("SELECT COALESCE(MAX(slot), 0) FROM collection WHERE user_id = ?", (user_id,))
+    return row[0] if row else 0
+
+
+async def get_card(db, user_id, slot):
+    """Return the user's card at `slot` as a dict, or None."""
+    row = await db.fetchone(f"SELECT {CARD_COLUMNS} FROM collection WHERE user_id = ? AND slot = ?", (user_id, slot))
+    return card_from_row(row) if row else None
+
+
+async def insert_card(db, user_id, character, stats):
+    """Append a caught character to the end of the user's collection; returns its ROWID."""
+    hp, attack, defense, speed, iv = stats
+    cursor = await db.execute(
+        "INSERT INTO collection (user_id, character_name, anime, rarity, hp, attack, defense, speed, iv, slot) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(slot), 0) + 1 FROM collection WHERE user_id = ?))",
+        (user_id, character["name"], character["anime"], character["rarity"], hp, attack, defense, speed, iv, user_id)
+    )
+    return cursor.lastrowid
+
+
+async def delete_card(db, rowid):
+    """Delete one card and close the gap in its owner's slot numbers. Returns False if it was gone."""
+    row = await db.fetchone("SELECT user_id, slot FROM collection WHERE ROWID = ?", (rowid,))
+    if not row:
+        return False
+    user_id, slot = row
+    await db.execute("DELETE FROM collection WHERE ROWID = ?", (rowid,))
+    await db.execute("UPDATE collection SET slot = slot - 1 WHERE user_id = ? AND slot > ?", (user_id, slot))
+    return True
+
+
+async def card_page(db, user_id, after_slot=0, before_slot=None, limit=10):
+    """One page of (slot, name, rarity, anime, level) rows using keyset pagination on the slot index.
+
+    Pages forward from `after_slot`, or backward from `before_slot` when given; rows are always
+    returned in ascending slot order.
+    """
+    if before_slot is None:
+        return await db.fetchall(
+            "SELECT slot, character_name, rarity, anime, COALESCE(level,1) FROM collection "
+            "WHERE user_id = ? AND slot > ? ORDER BY slot LIMIT ?",
+            (user_id, after_slot, limit)
+        )
+    rows = await db.fetchall(
+        "SELECT slot, character_name, rarity, anime, COALESCE(level,1) FROM collection "
+        "WHERE user_id = ? AND slot < ? ORDER BY slot DESC LIMIT ?",
+        (user_id, before_slot, limit)
+    )
+    rows.reverse()
+    return rows
+
+
+# -------------------- BULK RELEASE --------------------
+def _rarity_rank():
+    """CASE expression ranking rarities rarest first (lowest spawn weight); unknown ones sort last."""
+    rarest_first = sorted(RARITY_WEIGHTS, key=RARITY_WEIGHTS.get)
+    whens = " ".join("WHEN '{}' THEN {}".format(name.replace("'", "''"), i) for i, name in enumerate(rarest_first))
+    return f"CASE rarity {whens} ELSE {len(rarest_first)} END"
+
+
+# Which copy of a character `duplicates keep-best` keeps: rarest (so a Mythic is never traded
+# for a Common), then highest level, exp, stat total, IV, oldest
+DUPLICATE_RANK = (
+    f"ROW_NUMBER() OVER (PARTITION BY character_name "
+    f"ORDER BY {_rarity_rank()}, COALESCE(level,1) DESC, COALESCE(exp,0) DESC, hp + attack + defense + speed DESC, iv DESC, slot)"
+)
+
+
+def selection_where(user_id, selection):
+    """WHERE clause and params for a bulk selection: ("range", lo, hi), ("rarity", name) or ("duplicates",)."""
+    kind = selection[0]
+    if kind == "range":
+        return "user_id = ? AND slot BETWEEN ? AND ?", (user_id, selection[1], selection[2])
+    if kind == "rarity":
+        return "user_id = ? AND rarity = ?", (user_id, selection[1])
+    if kind == "duplicates":
+        return (
+            f"ROWID IN (SELECT rid FROM (SELECT ROWID AS rid, {DUPLICATE_RANK} AS n FROM collection WHERE user_id = ?) WHERE n > 1)",
+            (user_id,),
+        )
+    raise ValueError(f"unknown selection {selection!r}")
+
+
+async def selection_cards(db, user_id, selection):
+    """[(rowid, rarity)] of the cards a bulk selection matches right now, in slot order.
+
+    The preview and the delete both use these ROWIDs, so a confirmed release removes exactly
+    the cards that were shown even if slots shift while the prompt is open.
+    """
+    where, params = selection_where(user_id, selection)
+    return await db.fetchall(f"SELECT ROWID, rarity FROM collection WHERE {where} ORDER BY slot", params)
+
+
+def selection_summary(cards):
+    """[(rarity, count)] for rows from selection_cards, most common first."""
+    counts = {}
+    for _, rarity in cards:
+        counts[rarity] = counts.get(rarity, 0) + 1
+    return sorted(counts.items(), key=lambda item: -item[1])
+
+
+async def renumber_slots(db, user_id):
+    """Make the user's slots 1..N again, in their current order (after a bulk delete)."""
+    await db.execute("""
+        UPDATE collection SET slot = numbered.n
+        FROM (SELECT ROWID AS rid, ROW_NUMBER() OVER (ORDER BY slot) AS n FROM collection WHERE user_id = ?) AS numbered
+        WHERE collection.ROWID = numbered.rid AND collection.slot != numbered.n
+    """, (user_id,))
+
+
+async def delete_cards(db, user_id, rowids):
+    """Delete the user's cards with these ROWIDs in one statement and close the slot gaps.
+
+    Cards already gone (released or cleared meanwhile) are skipped; returns how many were deleted.
+    """
+    # one JSON array parameter instead of a placeholder per card, so any number fits in one statement
+    cursor = await db.execute(
+        "DELETE FROM collection WHERE user_id = ? AND ROWID IN (SELECT value FROM json_each(?))",
+        (user_id, json.dumps(list(rowids)))
+    )
+    deleted = cursor.rowcount
+    if deleted <= 0:
+        return 0
+    await renumber_slots(db, user_id)
+    return deleted
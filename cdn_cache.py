@@ -0,0 +1,61 @@
+# cdn_cache.py
+import time
+from urllib.parse import parse_qs, urlsplit
+
+
+def url_expiry(url, default_ttl):
+    """Unix time a Discord CDN URL stops working (signed URLs carry it as hex `ex`)."""
+    try:
+        ex = parse_qs(urlsplit(url).query).get("ex")
+        if ex:
+            return int(ex[0], 16)
+    except ValueError:
+        pass
+    return time.time() + default_ttl
+
+
+class AttachmentURLCache:
+    """Remembers the CDN URL of art we've already uploaded so later embeds can link it.
+
+    Discord attachment URLs are signed and expire (the `ex` query param); entries are
+    dropped `refresh_margin` seconds before that so the next send re-uploads and records
+    a fresh URL.
+    """
+
+    def __init__(self, refresh_margin=3600.0, default_ttl=12 * 3600.0):
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self._urls = {}  # {key: (url, expires_at)}
+        self.hits = 0
+        self.uploads = 0
+
+    def get(self, key):
+        entry = self._urls.get(key)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if time.time() >= expires_at - self.refresh_margin:
+            del self._urls[key]
+            return None
+        self.hits += 1
+        return url
+
+    def record(self, key, message, filename):
+        """Store the CDN URL of `filename` from a message we just sent."""
+        self.uploads += 1
+        url = None
+        for attachment in getattr(message, "attachments", ()):
+            if attachment.filename == filename:
+                url = attachment.url
+                break
+        if url is None:
+            for embed in getattr(message, "embeds", ()):
+                if embed.image and embed.image.url and not embed.image.url.startswith("attachment://"):
+                    url = embed.image.url
+                    break
+        if url:
+            self._urls[key] = (url, url_expiry(url, self.default_ttl))
+        return url
+
+    def stats(self):
+        return {"urls": len(self._urls), "hits": self.hits, "uploads": self.uploads}
@@ -1,30 +1,100 @@
+import json
 import random
 import os
 
-CHARACTERS = [
-    {"id": 1, "name": "Naruto Uzumaki", "anime": "Naruto"},
-    {"id": 2, "name": "Sasuke Uchiha", "anime": "Naruto"},
-    {"id": 3, "name": "Luffy", "anime": "One Piece"},
-    {"id": 4, "name": "Gojo Satoru", "anime": "Jujutsu Kaisen"},
-    {"id": 5, "name": "Goku", "anime": "Dragon Ball"},
-    {"id": 6, "name": "Tanjiro Kamado", "anime": "Demon Slayer"},
-    {"id": 7, "name": "Mikasa Ackerman", "anime": "Attack on Titan"},
-    {"id": 8, "name": "Light Yagami", "anime": "Death Note"},
-    {"id": 9, "name": "Saitama", "anime": "One Punch Man"},
-    {"id": 10, "name": "Levi Ackerman", "anime": "Attack on Titan"},
-    {"id": 11, "name": "Izuku Midoriya", "anime": "My Hero Academia"},
-    {"id": 12, "name": "Itsuki Nakano", "anime": "The Quintessential Quintuplets"},
-]
-
-RARITY_WEIGHTS = {"Common":55,"Rare":25,"Epic":12,"Legendary":6,"Mythic":2}
+# The catalog lives in characters.json: add characters (and per-character "weight" or
+# per-anime "anime_weights") there, no code changes needed.
+CATALOG_PATH = os.getenv("CHARACTERS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "characters.json"))
+
+
+class AliasTable:
+    """Vose alias table: weighted sampling in O(1) regardless of how many items there are."""
+    __slots__ = ("prob", "alias", "n")
+
+    def __init__(self, weights):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("cannot sample from an empty weight list")
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("weights must add up to more than zero")
+        scaled = [w * n / total for w in weights]
+        prob = [0.0] * n
+        alias = [0] * n
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in large + small:  # leftovers are 1.0 up to float error
+            prob[i] = 1.0
+        self.prob = prob
+        self.alias = alias
+        self.n = n
+
+    def sample(self, rng=random):
+        i = rng.randrange(self.n)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class Catalog:
+    """Characters stored as parallel lists with an id index and precomputed alias tables."""
+
+    def __init__(self, characters, rarity_weights, anime_weights=None):
+        anime_weights = anime_weights or {}
+        self.ids = []
+        self.names = []
+        self.animes = []
+        self.aliases = []  # extra accepted names per character
+        weights = []
+        for c in characters:
+            self.ids.append(c["id"])
+            self.names.append(c["name"])
+            self.animes.append(c["anime"])
+            self.aliases.append(tuple(c.get("aliases", ())))
+            weights.append(c.get("weight", 1) * anime_weights.get(c["anime"], 1))
+        self.by_id = {cid: i for i, cid in enumerate(self.ids)}
+        self.rarity_weights = dict(rarity_weights)
+        self.rarities = list(rarity_weights)
+        self._characters = AliasTable(weights)
+        self._rarities = AliasTable(list(rarity_weights.values()))
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH):
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        return cls(data["characters"], data["rarity_weights"], data.get("anime_weights"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def entry(self, i):
+        entry = {"id": self.ids[i], "name": self.names[i], "anime": self.animes[i]}
+        if self.aliases[i]:
+            entry["aliases"] = list(self.aliases[i])
+        return entry
+
+    def sample_index(self, rng=random):
+        return self._characters.sample(rng)
+
+    def sample_rarity(self, rng=random):
+        return self.rarities[self._rarities.sample(rng)]
+
+
+catalog = Catalog.load()
+
+# Plain views kept for existing callers
+CHARACTERS = [catalog.entry(i) for i in range(len(catalog))]
+RARITY_WEIGHTS = catalog.rarity_weights
 
 def random_character():
-    # Pick a random character
-    character = random.choice(CHARACTERS).copy()
-    # Assign random rarity based on weights
-    rarities = list(RARITY_WEIGHTS.keys())
-    weights = list(RARITY_WEIGHTS.values())
-    character["rarity"] = random.choices(rarities, weights=weights)[0]
+    # Pick a weighted random character and rarity, both O(1) via alias tables
+    character = catalog.entry(catalog.sample_index())
+    character["rarity"] = catalog.sample_rarity()
     return character
 
 def get_character_image(name):
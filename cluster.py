@@ -0,0 +1,101 @@
+# cluster.py
+"""Run the bot as several processes, each owning a contiguous group of shards.
+
+    python cluster.py --shards 8 --processes 4
+
+Starts a state server (state.py) in this process, then one `bot.py` per shard group with
+BOT_SHARD_IDS / BOT_SHARD_COUNT / STATE_URL set. Crashed bot processes are restarted.
+Each process gets its own metrics port (METRICS_PORT + process index).
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+
+from state import StateServer
+
+
+def shard_groups(shard_count, processes):
+    """Split shard ids 0..shard_count-1 into `processes` contiguous, near-equal groups."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+
+async def supervise(index, env, stopping, procs, restart_delay=5.0):
+    """Keep one bot process running until `stopping` is set."""
+    while not stopping.is_set():
+        proc = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=env)
+        procs[index] = proc
+        code = await proc.wait()
+        if stopping.is_set():
+            break
+        print(f"[cluster] process {index} (shards {env['BOT_SHARD_IDS']}) exited with {code}; restarting in {restart_delay:.0f}s")
+        try:
+            await asyncio.wait_for(stopping.wait(), restart_delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args):
+    server = StateServer(host=args.state_host, port=args.state_port)
+    await server.start()
+    print(f"[cluster] state server on {args.state_host}:{args.state_port}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    metrics_base = int(os.getenv("METRICS_PORT", "9108"))
+    tasks, procs = [], {}
+    for index, shards in enumerate(shard_groups(args.shards, args.processes)):
+        env = dict(
+            os.environ,
+            BOT_SHARD_IDS=",".join(map(str, shards)),
+            BOT_SHARD_COUNT=str(args.shards),
+            STATE_URL=f"tcp://{args.state_host}:{args.state_port}",
+            METRICS_PORT=str(metrics_base + index if metrics_base else 0),
+        )
+        print(f"[cluster] starting process {index} with shards {env['BOT_SHARD_IDS']}")
+        tasks.append(asyncio.create_task(supervise(index, env, stopping, procs)))
+        # Discord only allows one IDENTIFY per ~5s (per bucket), so stagger the groups
+        try:
+            await asyncio.wait_for(stopping.wait(), args.stagger * len(shards))
+        except asyncio.TimeoutError:
+            pass
+
+    await stopping.wait()
+    print("[cluster] shutting down")
+    for proc in procs.values():
+        if proc.returncode is None:
+            proc.terminate()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, required=True, help="total shard count")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="bot processes (default: CPU count)")
+    parser.add_argument("--state-host", default="127.0.0.1")
+    parser.add_argument("--state-port", type=int, default=8765)
+    parser.add_argument("--stagger", type=float, default=5.0, help="seconds between starting groups, per shard")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# confirmations.py
+import asyncio
+
+import discord
+
+_NO_MATCH = object()
+
+# (button label, value returned, button style, text replies that also pick it)
+YES_NO = (
+    ("Confirm", True, discord.ButtonStyle.danger, ("yes", "y")),
+    ("Cancel", False, discord.ButtonStyle.secondary, ("no", "n")),
+)
+
+
+class Prompt:
+    __slots__ = ("key", "user_id", "options", "replies", "future", "timer", "message", "view")
+
+    def __init__(self, key, user_id, options, future):
+        self.key = key
+        self.user_id = user_id
+        self.options = options
+        self.replies = {reply: value for _, value, _, replies in options for reply in replies}
+        self.future = future
+        self.timer = None
+        self.message = None
+        self.view = None
+
+
+class PromptView(discord.ui.View):
+    """Buttons for one prompt; only the prompted user can press them."""
+
+    def __init__(self, confirmations, prompt):
+        super().__init__(timeout=None)  # expiry runs on the shared timer wheel, not a task per view
+        self.confirmations = confirmations
+        self.prompt = prompt
+        for label, value, style, _ in prompt.options:
+            button = discord.ui.Button(label=label, style=style)
+            button.callback = self._answer(value)
+            self.add_item(button)
+
+    def disable(self):
+        for item in self.children:
+            item.disabled = True
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.prompt.user_id:
+            await interaction.response.send_message("❌ This prompt isn't for you.", ephemeral=True)
+            return False
+        return True
+
+    def _answer(self, value):
+        async def callback(interaction):
+            if self.prompt.future.done():
+                return await interaction.response.send_message("⌛ This prompt has expired.", ephemeral=True)
+            self.disable()
+            self.confirmations._resolve(self.prompt, value, edit=False)
+            await interaction.response.edit_message(view=self)
+        return callback
+
+
+class Confirmations:
+    """Pending prompts keyed by (channel_id, user_id).
+
+    A typed reply is matched with one dict lookup from on_message (instead of every open
+    prompt's wait_for check running on every message); button presses are routed by
+    discord.py's view store and never touch on_message. Timeouts ride the timer wheel.
+    """
+
+    def __init__(self, timers):
+        self.timers = timers
+        self._pending = {}  # {(channel_id, user_id): Prompt}
+        self._edits = set()  # in-flight "disable buttons" edits
+
+    async def ask(self, dest, user_id, content, options=YES_NO, timeout=30.0):
+        """Send `content` with a button per option; return the chosen value, or None on timeout.
+
+        A newer prompt for the same user in the same channel replaces (times out) the older one.
+        """
+        channel = getattr(dest, "channel", dest)
+        key = (channel.id, user_id)
+        previous = self._pending.get(key)
+        if previous is not None:
+            self._resolve(previous, None)
+        prompt = Prompt(key, user_id, options, asyncio.get_running_loop().create_future())
+        self._pending[key] = prompt
+        prompt.view = PromptView(self, prompt)
+        prompt.timer = self.timers.schedule(timeout, self._resolve, prompt, None)
+        try:
+            prompt.message = await dest.send(content, view=prompt.view)
+        except BaseException:
+            self._resolve(prompt, None, edit=False)
+            raise
+        return await prompt.future
+
+    def dispatch(self, message):
+        """Resolve the author's prompt in this channel if the message is one of its replies."""
+        prompt = self._pending.get((message.channel.id, message.author.id))
+        if prompt is None:
+            return False
+        value = prompt.replies.get(message.content.strip().lower(), _NO_MATCH)
+        if value is _NO_MATCH:
+            return False
+        self._resolve(prompt, value)
+        return True
+
+    def _resolve(self, prompt, value, edit=True):
+        if prompt.future.done():
+            return
+        if self._pending.get(prompt.key) is prompt:
+            del self._pending[prompt.key]
+        if prompt.timer is not None:
+            prompt.timer.cancel()
+        prompt.view.stop()
+        prompt.future.set_result(value)
+        if edit and prompt.message is not None:
+            prompt.view.disable()
+            task = asyncio.ensure_future(self._edit(prompt))
+            self._edits.add(task)
+            task.add_done_callback(self._edits.discard)
+
+    async def _edit(self, prompt):
+        try:
+            await prompt.message.edit(view=prompt.view)
+        except discord.HTTPException:
+            pass
+
+    def pending(self):
+        return len(self._pending)
@@ -0,0 +1,122 @@
+# diagnostics.py
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    # function-level granularity keeps flame graphs readable; ';' separates frames in the folded format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return ";".join(stack)
+
+
+class LoopWatchdog:
+    """Detects event-loop stalls and captures what the loop thread was running at the time.
+
+    The loop bumps a heartbeat every `interval`; a daemon thread notices when the heartbeat
+    is older than `threshold` and snapshots the loop thread's stack via sys._current_frames(),
+    so the report shows the blocking call itself (a blur, a stat, a query) rather than just
+    "something was slow".
+    """
+
+    def __init__(self, threshold=0.25, interval=0.05, keep=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=keep)  # dicts: started (unix), duration (s), stack (str)
+        self._loop = None
+        self._loop_thread = None
+        self._last_beat = 0.0
+        self._handle = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def start(self, threshold=None):
+        """Start watching the running loop (call from the loop thread)."""
+        if threshold is not None:
+            self.threshold = threshold
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._beat()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._handle.cancel()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _watch(self):
+        current = None  # the stall being observed, if any
+        while not self._stop.wait(self.interval / 2):
+            now = time.monotonic()
+            late = now - self._last_beat - self.interval
+            if late < self.threshold:
+                if current is not None:
+                    current["duration"] = now - current.pop("_began")
+                    self.stalls.append(current)
+                    current = None
+                continue
+            if current is None:
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else "(loop thread not found)"
+                current = {"started": time.time() - late, "duration": late, "stack": stack, "_began": now - late}
+        if current is not None:
+            current["duration"] = time.monotonic() - current.pop("_began")
+            self.stalls.append(current)
+
+
+def sample_profile(duration=10.0, interval=0.005, thread_ids=None):
+    """Sample thread stacks for `duration` seconds and return collapsed-stack text.
+
+    Output is one `frame;frame;...;leaf count` line per distinct stack (the "folded" format
+    consumed by flamegraph.pl, speedscope and inferno). Pass `thread_ids` to limit sampling
+    to specific threads; the sampling thread itself is always skipped. Blocking: run it
+    with asyncio.to_thread.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (thread_ids is not None and ident not in thread_ids):
+                continue
+            stacks[f"{names.get(ident, ident)};{_collapse(frame)}"] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_frames(folded, limit=5):
+    """[(leaf frame, samples)] with the most self time in a collapsed-stack dump."""
+    leaves = Counter()
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    return leaves.most_common(limit)
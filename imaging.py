@@ -0,0 +1,209 @@
+# imaging.py
+# Pillow rendering jobs. Kept free of discord/bot imports so they can run in worker processes.
+import io
+import math
+import os
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageFilter
+except Exception:
+    Image = None
+
+
+def _compose_spawn_image(image_path, rarity=None):
+    """Return a BytesIO image (PNG or animated GIF) for spawn with glow/animation based on rarity."""
+    if Image is None:
+        return None
+    try:
+        img = Image.open(image_path).convert("RGBA")
+        w, h = img.size
+        pad = 120
+        canvas_size = (w + pad, h + pad)
+        base = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
+        cx = (canvas_size[0] - w) // 2
+        cy = 30
+
+        # rarity color
+        rc = {"Common": (120,120,120), "Rare": (30,144,255), "Epic": (147,112,219), "Legendary": (138,43,226), "Mythic": (255,215,0)}
+        color = rc.get(rarity, (100,100,100))
+
+        # create colored mask from image alpha
+        glow = Image.new("RGBA", img.size, color + (255,))
+        mask = img.split()[3]
+        glow.putalpha(mask)
+
+        # Legendary/Mythic: animated pulsing glow (GIF)
+        if rarity in ("Legendary", "Mythic"):
+            frames = []
+            for i in range(6):
+                radius = 6 + i * 3
+                alpha_mul = 120 + int(100 * (0.5 + 0.5 * math.sin(i / 6.0 * 2 * math.pi)))
+                g = glow.copy()
+                g = g.filter(ImageFilter.GaussianBlur(radius=radius))
+                # dim/brighten by multiplying alpha
+                alpha = g.split()[3].point(lambda p: min(255, int(p * (alpha_mul / 255.0))))
+                g.putalpha(alpha)
+                frame = base.copy()
+                frame.paste(g, (cx, cy), g)
+                frame.paste(img, (cx, cy), img)
+                frames.append(frame)
+            bio = io.BytesIO()
+            frames[0].save(bio, format="GIF", save_all=True, append_images=frames[1:], loop=0, duration=90, disposal=2)
+            bio.seek(0)
+            return bio
+        else:
+            g = glow.filter(ImageFilter.GaussianBlur(radius=18))
+            base.paste(g, (cx, cy), g)
+            base.paste(img, (cx, cy), img)
+            bio = io.BytesIO()
+            base.save(bio, format="PNG")
+            bio.seek(0)
+            return bio
+    except Exception:
+        return None
+
+def _compose_battle_image(p1_path, p2_path, p1_name, p1_hp, p1_max, p2_name, p2_hp, p2_max, p1_rarity=None, p2_rarity=None):
+    """Return a BytesIO PNG of two styled character cards side-by-side with health bars above each.
+
+    Adds rounded portraits, rarity-colored frames, level badges and nicer fonts when Pillow is available.
+    """
+    if Image is None:
+        return None
+    try:
+        def load_or_placeholder(path):
+            if path and os.path.exists(path):
+                img = Image.open(path).convert("RGBA")
+            else:
+                img = Image.new("RGBA", (320, 320), (90,90,90,255))
+            return img
+
+        img1 = load_or_placeholder(p1_path)
+        img2 = load_or_placeholder(p2_path)
+
+        # target heights
+        target_h = 260
+        def resize_to_height(img, h):
+            w, _ = img.size
+            new_w = int(w * (h / img.size[1]))
+            return img.resize((new_w, h))
+
+        img1 = resize_to_height(img1, target_h)
+        img2 = resize_to_height(img2, target_h)
+
+        padding = 28
+        bar_h = 30
+
+        # font: prefer Arial, fallback to default
+        try:
+            font = ImageFont.truetype("arial.ttf", 16)
+            font_bold = ImageFont.truetype("arialbd.ttf", 18)
+        except Exception:
+            font = ImageFont.load_default()
+            font_bold = font
+
+        # rarity colors
+        rc = {"Common": (120,120,120), "Rare": (30,144,255), "Epic": (147,112,219), "Legendary": (138,43,226), "Mythic": (255,215,0)}
+        col1 = rc.get(p1_rarity, (80,80,80))
+        col2 = rc.get(p2_rarity, (80,80,80))
+
+        canvas_w = img1.width + img2.width + padding * 3
+        canvas_h = target_h + bar_h + 70
+        canvas = Image.new("RGBA", (canvas_w, canvas_h), (34,36,40,255))
+        draw = ImageDraw.Draw(canvas)
+
+        x1 = padding
+        x2 = padding * 2 + img1.width
+
+        # helper: rounded mask
+        def rounded(img, radius=30):
+            mask = Image.new('L', img.size, 0)
+            drawm = ImageDraw.Draw(mask)
+            drawm.rounded_rectangle([0,0,img.size[0],img.size[1]], radius=radius, fill=255)
+            out = Image.new('RGBA', img.size, (0,0,0,0))
+            out.paste(img, (0,0), mask)
+            return out
+
+        rim = 6
+        r1 = rounded(img1, radius=24)
+        r2 = rounded(img2, radius=24)
+
+        # draw health bar function with nicer style
+        def draw_health_bar(x, y, width, hp, hp_max, color):
+            # background bar
+            draw.rounded_rectangle([x, y, x+width, y+bar_h], radius=12, fill=(60,60,60,255))
+            ratio = max(0.0, min(1.0, hp / max(1, hp_max)))
+            filled = int(width * ratio)
+            fill_color = color if isinstance(color, tuple) else (80,200,120)
+            draw.rounded_rectangle([x, y, x+filled, y+bar_h], radius=12, fill=fill_color)
+            # text
+            txt = f"{hp}/{hp_max}"
+            tw, th = draw.textsize(txt, font=font_bold)
+            draw.text((x+width - tw - 8, y + (bar_h-th)//2), txt, font=font_bold, fill=(255,255,255,255))
+
+        # draw bars above images
+        draw_health_bar(x1, 10, img1.width, p1_hp, p1_max, col1)
+        draw_health_bar(x2, 10, img2.width, p2_hp, p2_max, col2)
+
+        # paste framed images with border
+        # border rectangles
+        draw.rounded_rectangle([x1-rim, 10+bar_h+8-rim, x1+img1.width+rim, 10+bar_h+8+img1.height+rim], radius=26, outline=col1+(200,), width=4)
+        draw.rounded_rectangle([x2-rim, 10+bar_h+8-rim, x2+img2.width+rim, 10+bar_h+8+img2.height+rim], radius=26, outline=col2+(200,), width=4)
+
+        canvas.paste(r1, (x1, 10 + bar_h + 8), r1)
+        canvas.paste(r2, (x2, 10 + bar_h + 8), r2)
+
+        # level badges (use small circles)
+        def draw_level_badge(cx, cy, lvl, color):
+            badge_r = 18
+            draw.ellipse([cx-badge_r, cy-badge_r, cx+badge_r, cy+badge_r], fill=color)
+            lvtxt = str(lvl)
+            tw, th = draw.textsize(lvtxt, font=font_bold)
+            draw.text((cx - tw/2, cy - th/2), lvtxt, font=font_bold, fill=(0,0,0,255))
+
+        # attempt to position badges top-left of each portrait
+        draw_level_badge(x1+26, 10 + bar_h + 8 + 26, 1, col1)
+        draw_level_badge(x2+26, 10 + bar_h + 8 + 26, 1, col2)
+
+        # draw names under images
+        n1y = 10 + bar_h + 8 + img1.height + 6
+        n2y = 10 + bar_h + 8 + img2.height + 6
+        draw.text((x1, n1y), p1_name, font=font_bold, fill=(255,255,255,255))
+        draw.text((x2, n2y), p2_name, font=font_bold, fill=(255,255,255,255))
+
+        bio = io.BytesIO()
+        canvas.save(bio, format="PNG")
+        bio.seek(0)
+        return bio
+    except Exception:
+        return None
+
+
+# name: (max width, max height) of the bounding box each variant is fitted into
+VARIANT_SIZES = {
+    "card": (512, 512),      # !acatch / !info / spawn art
+    "thumb": (128, 128),     # embed thumbnails
+    "portrait": (400, 260),  # battle image (drawn 260px tall)
+}
+
+def make_variants(src_path, out_dir, stem, webp=False):
+    """Write downscaled, optimized copies of src_path into out_dir; returns {variant: filename}."""
+    if Image is None:
+        return {}
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        src = Image.open(src_path).convert("RGBA")
+        written = {}
+        for variant, box in VARIANT_SIZES.items():
+            img = src.copy()
+            img.thumbnail(box, Image.LANCZOS)
+            ext = "webp" if webp else "png"
+            filename = f"{stem}-{variant}.{ext}"
+            tmp = os.path.join(out_dir, f"{filename}.{os.getpid()}.tmp")
+            if webp:
+                img.save(tmp, format="WEBP", quality=85, method=6)
+            else:
+                img.save(tmp, format="PNG", optimize=True)
+            os.replace(tmp, os.path.join(out_dir, filename))
+            written[variant] = filename
+        return written
+    except Exception:
+        return {}
@@ -0,0 +1,90 @@
+# leaderboard.py
+import time
+
+# user_stats mirrors each player's coin balance and card count. Triggers on collection and
+# user_wallet keep it current as catches, releases and wallet updates happen, so the
+# leaderboard is an indexed top-N read instead of a UNION / GROUP BY over every card.
+USER_STATS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        coins INTEGER NOT NULL DEFAULT 0,
+        cards INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_stats_rank ON user_stats(coins DESC, cards DESC)",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_collection_insert_stats AFTER INSERT ON collection
+    BEGIN
+        INSERT INTO user_stats (user_id, cards) VALUES (NEW.user_id, 1)
+        ON CONFLICT(user_id) DO UPDATE SET cards = cards + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_collection_delete_stats AFTER DELETE ON collection
+    BEGIN
+        UPDATE user_stats SET cards = cards - 1 WHERE user_id = OLD.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_wallet_insert_stats AFTER INSERT ON user_wallet
+    BEGIN
+        INSERT INTO user_stats (user_id, coins) VALUES (NEW.user_id, COALESCE(NEW.coins, 0))
+        ON CONFLICT(user_id) DO UPDATE SET coins = excluded.coins;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_wallet_update_stats AFTER UPDATE OF coins ON user_wallet
+    BEGIN
+        UPDATE user_stats SET coins = COALESCE(NEW.coins, 0) WHERE user_id = NEW.user_id;
+    END
+    """,
+)
+
+# Added by migration 5: a deleted wallet row (e.g. `backup.py import --replace`) zeroes the
+# mirrored balance instead of leaving the old coins on the leaderboard
+WALLET_DELETE_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_wallet_delete_stats AFTER DELETE ON user_wallet
+    BEGIN
+        UPDATE user_stats SET coins = 0 WHERE user_id = OLD.user_id;
+    END
+"""
+
+
+async def ensure_user_stats(db):
+    """Create user_stats and its triggers, backfilling it the first time (run inside a transaction)."""
+    exists = await db.fetchone("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'")
+    for statement in USER_STATS_SCHEMA:
+        await db.execute(statement)
+    if not exists:
+        await db.execute("""
+            INSERT INTO user_stats (user_id, coins, cards)
+            SELECT u.user_id, COALESCE(uw.coins, 0), COALESCE(c.total, 0)
+            FROM (SELECT user_id FROM collection UNION SELECT user_id FROM user_wallet) u
+            LEFT JOIN user_wallet uw ON u.user_id = uw.user_id
+            LEFT JOIN (SELECT user_id, COUNT(*) AS total FROM collection GROUP BY user_id) c ON u.user_id = c.user_id
+        """)
+
+
+class Leaderboard:
+    """Top-N richest collectors with a short-lived snapshot so busy channels share one query."""
+
+    def __init__(self, storage, size=10, ttl=15.0):
+        self.storage = storage
+        self.size = size
+        self.ttl = ttl
+        self._snapshot = None
+        self._taken_at = 0.0
+
+    async def top(self):
+        """Return [(user_id, coins, cards)] ordered by coins then cards."""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._taken_at < self.ttl:
+            return self._snapshot
+        rows = await self.storage.fetchall(
+            "SELECT user_id, coins, cards FROM user_stats ORDER BY coins DESC, cards DESC LIMIT ?",
+            (self.size,)
+        )
+        self._snapshot = rows
+        self._taken_at = now
+        return rows
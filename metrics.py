@@ -0,0 +1,210 @@
+# metrics.py
+import asyncio
+import bisect
+import inspect
+import time
+
+# Upper bounds in seconds; the implicit +Inf bucket catches the rest
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+EXPOSITION_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{v}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # {label values: total}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        for values, total in self._values.items():
+            yield self.name, _labels(self.labels, values), total
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # {label values: [per-bucket counts..., +Inf count, sum]}
+
+    def observe(self, value, *label_values):
+        state = self._values.get(label_values)
+        if state is None:
+            state = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self):
+        for values, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                yield self.name + "_bucket", _labels(self.labels, values, (("le", _number(bound)),)), cumulative
+            yield self.name + "_sum", _labels(self.labels, values), state[-1]
+            yield self.name + "_count", _labels(self.labels, values), cumulative
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # callbacks run before each scrape to refresh gauges
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    async def collect(self):
+        """Run the collectors (plain or async functions) so gauges are current."""
+        for fn in self._collectors:
+            try:
+                result = fn()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"Metrics collector {getattr(fn, '__name__', fn)} failed: {e}")
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def statement_kind(sql):
+    """SELECT / INSERT / UPDATE / DELETE / ... for labelling query timings without SQL-text cardinality."""
+    head = sql.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+
+class BotMetrics:
+    """The bot's instrumentation: command latency, DB and render time, spawns/catches and loop lag.
+
+    Recording is a dict update, so hooks stay cheap on the hot path; `serve()` exposes
+    everything on a local HTTP endpoint for Prometheus to scrape.
+    """
+
+    def __init__(self):
+        self.registry = r = Registry()
+        self.command_seconds = r.histogram("animebot_command_seconds", "Command latency from invoke to completion.", ("command", "status"))
+        self.command_calls = r.counter("animebot_command_calls_total", "Commands invoked, per server.", ("command", "guild"))
+        self.command_busy = r.counter("animebot_command_busy_seconds_total", "Time spent in commands, per server.", ("guild",))
+        self.query_seconds = r.histogram("animebot_db_query_seconds", "SQLite statement execution time.", ("statement",), QUERY_BUCKETS)
+        self.render_seconds = r.histogram("animebot_render_seconds", "Pillow render job time, including queueing.", ("job", "outcome"))
+        self.spawns = r.counter("animebot_spawns_total", "Characters spawned.", ("rarity", "source"))
+        self.catches = r.counter("animebot_catches_total", "Characters caught.", ("rarity",))
+        self.despawns = r.counter("animebot_despawns_total", "Spawns that expired uncaught.", ("rarity",))
+        self.handled_errors = r.counter("animebot_handled_errors_total", "Exceptions caught and reported inside a command.", ("command",))
+        self.loop_lag = r.histogram("animebot_event_loop_lag_seconds", "How late the event loop woke a periodic timer.", (), LAG_BUCKETS)
+        self.loop_lag_last = r.gauge("animebot_event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+        self._lag_task = None
+        self._runner = None
+
+    # -------------------- HOOKS --------------------
+    def command_started(self, ctx):
+        ctx._metrics_started = time.perf_counter()
+
+    def command_finished(self, ctx):
+        started = getattr(ctx, "_metrics_started", None)
+        if started is None or ctx.command is None:
+            return
+        elapsed = time.perf_counter() - started
+        guild = str(ctx.guild.id) if ctx.guild else "dm"
+        name = ctx.command.qualified_name
+        self.command_seconds.observe(elapsed, name, "error" if ctx.command_failed else "ok")
+        self.command_calls.inc(name, guild)
+        self.command_busy.inc(guild, amount=elapsed)
+
+    def query(self, sql, elapsed):
+        self.query_seconds.observe(elapsed, statement_kind(sql))
+
+    def render(self, job, elapsed, outcome):
+        self.render_seconds.observe(elapsed, job, outcome)
+
+    # -------------------- EVENT LOOP LAG --------------------
+    async def _sample_lag(self, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.loop_lag.observe(lag)
+            self.loop_lag_last.set(lag)
+
+    def start_lag_monitor(self, interval=0.5):
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._sample_lag(interval))
+
+    # -------------------- HTTP --------------------
+    async def serve(self, host="127.0.0.1", port=9108):
+        """Serve GET /metrics in the text exposition format (aiohttp ships with discord.py)."""
+        from aiohttp import web
+
+        async def handle(_request):
+            await self.registry.collect()
+            return web.Response(body=self.registry.render().encode(), headers={"Content-Type": EXPOSITION_CONTENT_TYPE})
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def close(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,108 @@
+# migrations.py
+"""Numbered schema migrations, applied once each and recorded in schema_version.
+
+Run from setup_hook before the gateway connects, so reconnects (on_ready) do no schema
+work. Append new migrations to MIGRATIONS; never renumber or edit an applied one.
+"""
+from cards import ensure_slots
+from leaderboard import WALLET_DELETE_TRIGGER, ensure_user_stats
+
+
+async def column_names(db, table):
+    return {row[1] for row in await db.fetchall(f"PRAGMA table_info({table})")}
+
+
+async def add_column(db, table, column, declaration):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there."""
+    if column not in await column_names(db, table):
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+# -------------------- MIGRATIONS --------------------
+async def _base_tables(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS collection (
+            user_id INTEGER,
+            character_name TEXT,
+            anime TEXT,
+            rarity TEXT,
+            hp INTEGER,
+            attack INTEGER,
+            defense INTEGER,
+            speed INTEGER,
+            iv INTEGER
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_wallet (
+            user_id INTEGER PRIMARY KEY,
+            coins INTEGER DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_profile (
+            user_id INTEGER PRIMARY KEY,
+            level INTEGER DEFAULT 1,
+            exp INTEGER DEFAULT 0
+        )
+    """)
+
+
+async def _card_levels(db):
+    # checked per column: databases where only `level` made it in still get `exp`
+    await add_column(db, "collection", "level", "INTEGER DEFAULT 1")
+    await add_column(db, "collection", "exp", "INTEGER DEFAULT 0")
+
+
+async def _card_slots(db):
+    # backs !collection / !info / !r / !fight and card counts (user_id, slot) lookups
+    await add_column(db, "collection", "slot", "INTEGER")
+    await ensure_slots(db)
+
+
+async def _user_stats(db):
+    # backs !leaderboard (idx_user_stats_rank) and is kept current by triggers
+    await ensure_user_stats(db)
+
+
+async def _wallet_delete_stats(db):
+    # user_stats kept stale coins for wallet rows removed by a DELETE; zero them from now on
+    await db.execute(WALLET_DELETE_TRIGGER)
+    await db.execute("UPDATE user_stats SET coins = 0 WHERE user_id NOT IN (SELECT user_id FROM user_wallet)")
+
+
+MIGRATIONS = (
+    (1, "base tables", _base_tables),
+    (2, "card level and exp columns", _card_levels),
+    (3, "card slots and idx_collection_user_slot", _card_slots),
+    (4, "user_stats leaderboard table and triggers", _user_stats),
+    (5, "user_stats trigger for deleted wallets", _wallet_delete_stats),
+)
+
+
+# -------------------- RUNNER --------------------
+async def schema_version(db):
+    row = await db.fetchone("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return row[0] if row else 0
+
+
+async def migrate(storage, migrations=MIGRATIONS):
+    """Apply pending migrations in order, each in its own transaction. Returns [(version, name)] applied."""
+    async with storage.transaction() as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    applied = []
+    for version, name, apply in migrations:
+        async with storage.transaction() as db:
+            # re-read inside the write transaction: another cluster process may have just applied it
+            if await schema_version(db) >= version:
+                continue
+            await apply(db)
+            await db.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+        applied.append((version, name))
+    return applied
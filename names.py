@@ -0,0 +1,78 @@
+# names.py
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^0-9a-z ]+")
+
+
+def normalize(text):
+    """Accent-folded, case-folded, punctuation-free form used for name matching."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = _NON_WORD.sub(" ", text.replace("-", " "))
+    return " ".join(text.split())
+
+
+def levenshtein(a, b, limit):
+    """Edit distance between a and b, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            cur.append(d)
+            if d < best:
+                best = d
+        if best > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def typo_budget(text):
+    """How many edits a guess of this length may contain."""
+    if len(text) <= 4:
+        return 0
+    if len(text) <= 8:
+        return 1
+    return 2
+
+
+class NameIndex:
+    """Precomputed accepted names per catalog entry.
+
+    Accepted keys per character: the full name, its first word and any aliases, all
+    normalized. Exact keys resolve through a dict; near-misses are checked against the
+    spawned character's own keys with a length-based typo budget.
+    """
+
+    def __init__(self):
+        self._exact = {}  # {normalized key: set(catalog index)}
+        self._keys = {}   # {catalog index: [normalized keys]}
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        index = cls()
+        for i, name in enumerate(catalog.names):
+            keys = [name, name.split()[0], *catalog.aliases[i]]
+            for key in keys:
+                index.add(normalize(key), i)
+        return index
+
+    def add(self, key, i):
+        if not key:
+            return
+        self._exact.setdefault(key, set()).add(i)
+        self._keys.setdefault(i, []).append(key)
+
+    def matches(self, guess, i):
+        """True if the guess names catalog entry i (a dict hit, or a near-miss of one of its keys)."""
+        key = normalize(guess)
+        hit = self._exact.get(key)
+        if hit is not None:
+            return i in hit
+        budget = typo_budget(key)
+        return budget > 0 and any(levenshtein(key, k, budget) <= budget for k in self._keys.get(i, ()))
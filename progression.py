@@ -0,0 +1,82 @@
+# progression.py
+from math import isqrt
+
+# Levelling rule: going from level L to L+1 costs L*100 exp, so reaching level L
+# from level 1 costs 50*L*(L-1) exp in total.
+CHAR_XP = 20
+USER_XP = 10
+RARITY_XP_BONUS = {"Common": 0, "Rare": 5, "Epic": 10, "Legendary": 20, "Mythic": 40}
+
+# SQLite's default host-parameter limit is 999 on older builds; stay well under it
+_CHUNK = 500
+
+
+def battle_xp(winner_card):
+    """(character xp, account xp) for winning a battle with `winner_card`."""
+    return CHAR_XP + RARITY_XP_BONUS.get(winner_card.get("rarity", "Common"), 0), USER_XP
+
+
+def apply_exp(level, exp, gained):
+    """Return (new_level, leftover_exp) after adding `gained` exp, in constant time."""
+    level = max(1, level or 1)
+    total = 50 * level * (level - 1) + (exp or 0) + gained
+    # largest L with 50*L*(L-1) <= total; isqrt gives it up to rounding, then nudge
+    new_level = max(1, (1 + isqrt(1 + (8 * total) // 100)) // 2)
+    while 50 * (new_level + 1) * new_level <= total:
+        new_level += 1
+    while new_level > 1 and 50 * new_level * (new_level - 1) > total:
+        new_level -= 1
+    return new_level, total - 50 * new_level * (new_level - 1)
+
+
+async def _select_in(db, sql, ids):
+    rows = []
+    ids = list(ids)
+    for i in range(0, len(ids), _CHUNK):
+        chunk = ids[i:i + _CHUNK]
+        rows += await db.fetchall(sql.format(",".join("?" * len(chunk))), chunk)
+    return rows
+
+
+async def award_many(storage, awards):
+    """Apply many (card_rowid, char_xp, user_id, user_xp) awards in one transaction.
+
+    Awards to the same card or user are summed first. Returns
+    {"cards": {rowid: (old_level, new_level)}, "users": {user_id: (old_level, new_level)}}.
+    """
+    card_gain = {}
+    user_gain = {}
+    for rowid, char_xp, user_id, user_xp in awards:
+        if rowid is not None and char_xp:
+            card_gain[rowid] = card_gain.get(rowid, 0) + char_xp
+        if user_id is not None and user_xp:
+            user_gain[user_id] = user_gain.get(user_id, 0) + user_xp
+
+    result = {"cards": {}, "users": {}}
+    async with storage.transaction() as db:
+        if card_gain:
+            rows = await _select_in(db, "SELECT ROWID, COALESCE(level,1), COALESCE(exp,0) FROM collection WHERE ROWID IN ({})", card_gain)
+            updates = []
+            for rowid, level, exp in rows:
+                new_level, new_exp = apply_exp(level, exp, card_gain[rowid])
+                updates.append((new_level, new_exp, rowid))
+                result["cards"][rowid] = (level, new_level)
+            await db.executemany("UPDATE collection SET level = ?, exp = ? WHERE ROWID = ?", updates)
+
+        if user_gain:
+            await db.executemany("INSERT OR IGNORE INTO user_profile (user_id, level, exp) VALUES (?, 1, 0)", [(uid,) for uid in user_gain])
+            rows = await _select_in(db, "SELECT user_id, COALESCE(level,1), COALESCE(exp,0) FROM user_profile WHERE user_id IN ({})", user_gain)
+            updates = []
+            for user_id, level, exp in rows:
+                new_level, new_exp = apply_exp(level, exp, user_gain[user_id])
+                updates.append((new_level, new_exp, user_id))
+                result["users"][user_id] = (level, new_level)
+            await db.executemany("UPDATE user_profile SET level = ?, exp = ? WHERE user_id = ?", updates)
+    return result
+
+
+async def award_battle(storage, winner_card):
+    """Award the standard battle-win xp to the winning card and its owner; returns (char_xp, user_xp)."""
+    char_xp, user_xp = battle_xp(winner_card)
+    await award_many(storage, [(winner_card["rowid"], char_xp, winner_card["user_id"], user_xp)])
+    return char_xp, user_xp
@@ -0,0 +1,107 @@
+# render.py
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class RenderService:
+    """Runs Pillow jobs in a process pool so blurs/encodes never block the event loop.
+
+    At most `max_pending` jobs are queued or running; beyond that `submit` returns None
+    immediately and callers use their plain-file fallback. Jobs that exceed `timeout`
+    also return None (the worker keeps its slot until it actually finishes).
+    """
+
+    def __init__(self, workers=2, max_pending=8, timeout=10.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+        self._latencies = deque(maxlen=512)  # seconds, most recent jobs
+        self.on_job = None  # optional callback(job name, seconds, outcome), e.g. for metrics export
+
+    def start(self):
+        if self._pool is None:
+            # "spawn" keeps workers clean of the bot's threads and open sockets
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    async def submit(self, fn, *args, timeout=None):
+        """Run fn(*args) in a worker and return its result, or None if saturated/failed/timed out."""
+        if self._pool is None:
+            self.start()
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return None
+
+        loop = asyncio.get_running_loop()
+        try:
+            cf = self._pool.submit(fn, *args)
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM on a huge image); rebuild the pool for the next job
+            self._pool = None
+            self.failures += 1
+            return None
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        # slot is freed when the worker really finishes, not when we stop waiting
+        cf.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+
+        start = time.perf_counter()
+        name = getattr(fn, "__name__", str(fn))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(cf), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._report(name, start, "timeout")
+            return None
+        except BrokenProcessPool:
+            self._pool = None
+            self.failures += 1
+            self._report(name, start, "error")
+            return None
+        except Exception as e:
+            print(f"Render job {name} failed: {e}")
+            self.failures += 1
+            self._report(name, start, "error")
+            return None
+        self._latencies.append(time.perf_counter() - start)
+        self.completed += 1
+        self._report(name, start, "ok")
+        return result
+
+    def _report(self, name, start, outcome):
+        if self.on_job is not None:
+            self.on_job(name, time.perf_counter() - start, outcome)
+
+    def stats(self):
+        lat = sorted(self._latencies)
+        def pct(p):
+            return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000 if lat else 0.0
+        return {
+            "queue_depth": self.pending,
+            "peak_queue_depth": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": lat[-1] * 1000 if lat else 0.0,
+        }
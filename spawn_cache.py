@@ -0,0 +1,159 @@
+# spawn_cache.py
+import asyncio
+import glob
+import os
+import time
+from collections import OrderedDict
+
+ANIMATED_RARITIES = ("Legendary", "Mythic")
+
+
+def spawn_filename(rarity):
+    """Attachment name Discord should see for a composed spawn of this rarity."""
+    return "spawn.gif" if rarity in ANIMATED_RARITIES else "spawn.png"
+
+
+class SpawnArtCache:
+    """Rendered spawn artwork keyed by (source image, rarity).
+
+    Lookups go memory LRU -> disk cache -> render. Entries are fingerprinted with the
+    source image's mtime/size, so replacing a PNG invalidates every rarity built from it.
+    `render` is an async callable (image_path, rarity) -> BytesIO or None.
+    """
+
+    def __init__(self, render, cache_dir=os.path.join(".cache", "spawn"), max_bytes=64 * 1024 * 1024, recheck_interval=60.0):
+        self._render = render
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.recheck_interval = recheck_interval
+        self._entries = OrderedDict()  # {(path, rarity): [fingerprint, data, checked_at]}
+        self._bytes = 0
+        self._inflight = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # -------------------- KEYS --------------------
+    @staticmethod
+    def _fingerprint(image_path):
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def _disk_prefix(self, image_path, rarity):
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        return os.path.join(self.cache_dir, f"{stem}-{rarity}-")
+
+    def _disk_path(self, image_path, rarity, fingerprint):
+        ext = "gif" if rarity in ANIMATED_RARITIES else "png"
+        return f"{self._disk_prefix(image_path, rarity)}{fingerprint}.{ext}"
+
+    # -------------------- MEMORY LRU --------------------
+    def _remember(self, key, fingerprint, data):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1])
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = [fingerprint, data, time.monotonic()]
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _invalidate(self, image_path):
+        """Drop memory entries for a source image that changed on disk."""
+        for key in [k for k in self._entries if k[0] == image_path]:
+            self._bytes -= len(self._entries.pop(key)[1])
+
+    # -------------------- DISK --------------------
+    def _read_disk(self, path):
+        try:
+            with open(path, "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, image_path, rarity, fingerprint, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            target = self._disk_path(image_path, rarity, fingerprint)
+            # remove renders of older versions of this source image
+            for stale in glob.glob(glob.escape(self._disk_prefix(image_path, rarity)) + "*"):
+                if stale != target:
+                    os.remove(stale)
+            tmp = f"{target}.{os.getpid()}.tmp"  # several cluster processes may share the cache dir
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, target)
+        except OSError:
+            pass
+
+    # -------------------- LOOKUP --------------------
+    async def get(self, image_path, rarity):
+        """Return the composed image bytes, or None if rendering is unavailable."""
+        key = (image_path, rarity)
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now - entry[2] < self.recheck_interval:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            # periodically confirm the source image hasn't changed
+            if self._fingerprint(image_path) == entry[0]:
+                entry[2] = now
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._invalidate(image_path)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await pending
+        task = asyncio.ensure_future(self._load(image_path, rarity))
+        self._inflight[key] = task
+        try:
+            return await task
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load(self, image_path, rarity):
+        fingerprint = await asyncio.to_thread(self._fingerprint, image_path)
+        if fingerprint is None:
+            return None
+        key = (image_path, rarity)
+        disk_path = self._disk_path(image_path, rarity, fingerprint)
+        data = await asyncio.to_thread(self._read_disk, disk_path)
+        if data is not None:
+            self.disk_hits += 1
+            self._remember(key, fingerprint, data)
+            return data
+
+        self.misses += 1
+        composed = await self._render(image_path, rarity)
+        if composed is None:
+            return None
+        data = composed.getvalue()
+        self._remember(key, fingerprint, data)
+        await asyncio.to_thread(self._write_disk, image_path, rarity, fingerprint, data)
+        return data
+
+    async def warm(self, jobs):
+        """Pre-render (image_path, rarity) pairs one at a time in the background."""
+        for image_path, rarity in jobs:
+            try:
+                await self.get(image_path, rarity)
+            except Exception as e:
+                print(f"Spawn cache warm-up failed for {image_path} ({rarity}): {e}")
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,88 @@
+# spawns.py
+import random
+import time
+
+
+class ChannelSpawn:
+    """Spawn state for one channel: message counter, next threshold and the active spawn."""
+    __slots__ = ("counter", "threshold", "character", "spawned_at")
+
+    def __init__(self, threshold):
+        self.counter = 0
+        self.threshold = threshold
+        self.character = None
+        self.spawned_at = 0.0
+
+
+class SpawnManager:
+    """Independent spawn cycles per channel, keyed by channel id.
+
+    Every operation is a dict lookup plus a few attribute updates, so the per-message
+    cost stays constant however many channels are active.
+    """
+
+    def __init__(self, min_messages=25, max_messages=40):
+        self.min_messages = min_messages
+        self.max_messages = max_messages
+        self._channels = {}
+
+    def _new_threshold(self):
+        return random.randint(self.min_messages, self.max_messages)
+
+    def _state(self, channel_id):
+        state = self._channels.get(channel_id)
+        if state is None:
+            state = self._channels[channel_id] = ChannelSpawn(self._new_threshold())
+        return state
+
+    def tick(self, channel_id):
+        """Count one message in the channel; True when it is time to spawn there."""
+        state = self._state(channel_id)
+        if state.character is not None:
+            return False
+        state.counter += 1
+        return state.counter >= state.threshold
+
+    def spawn(self, channel_id, character):
+        """Make `character` the active spawn in the channel and restart its cycle."""
+        state = self._state(channel_id)
+        state.character = character
+        state.spawned_at = time.monotonic()
+        state.counter = 0
+        state.threshold = self._new_threshold()
+
+    def get(self, channel_id):
+        """Active spawn in the channel, or None."""
+        state = self._channels.get(channel_id)
+        return state.character if state is not None else None
+
+    def clear(self, channel_id, character=None):
+        """Remove the active spawn (only if it is still `character`, when given)."""
+        state = self._channels.get(channel_id)
+        if state is None or state.character is None:
+            return False
+        # compared by value: with a state server the caller holds a deserialized copy
+        if character is not None and state.character != character:
+            return False
+        state.character = None
+        state.spawned_at = 0.0
+        return True
+
+    def claim(self, channel_id, character=None):
+        """Take the active spawn (only if it is still `character`, when given) and clear it.
+
+        Returns the claimed character, or None if the channel has no spawn or someone
+        else got there first. Only one caller can ever get a given spawn.
+        """
+        state = self._channels.get(channel_id)
+        if state is None or state.character is None:
+            return None
+        if character is not None and state.character != character:
+            return None
+        claimed = state.character
+        state.character = None
+        state.spawned_at = 0.0
+        return claimed
+
+    def active_count(self):
+        return sum(1 for state in self._channels.values() if state.character is not None)
@@ -0,0 +1,345 @@
+# state.py
+"""Shared bot state (spawns, battles, admin lock) behind one interface.
+
+LocalState keeps everything in this process. In clustered mode every shard process uses
+RemoteState, which forwards each operation to a single StateServer, so a catch or battle
+resolves the same way whichever process handles the message:
+
+    python state.py --port 8765    # standalone server (cluster.py runs one for you)
+"""
+import abc
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from spawns import SpawnManager
+
+
+class StateError(Exception):
+    """The state server rejected an operation."""
+
+
+class StateStore(abc.ABC):
+    """Operations the bot needs on shared state. Each call is atomic with respect to the others."""
+
+    # -------------------- SPAWNS --------------------
+    @abc.abstractmethod
+    async def spawn_tick(self, channel_id):
+        """Count one message in the channel; True when it is time to spawn there."""
+
+    @abc.abstractmethod
+    async def spawn_set(self, channel_id, character):
+        """Make `character` the channel's active spawn, replacing any other."""
+
+    @abc.abstractmethod
+    async def spawn_get(self, channel_id):
+        """The channel's active spawn, or None."""
+
+    @abc.abstractmethod
+    async def spawn_clear(self, channel_id, character=None):
+        """Remove the active spawn (only if it is still `character`, when given); True if removed."""
+
+    @abc.abstractmethod
+    async def spawn_claim(self, channel_id, character=None):
+        """Atomically take and clear the active spawn; the claimed character, or None if already gone."""
+
+    # -------------------- BATTLES --------------------
+    @abc.abstractmethod
+    async def battle_get(self, user_id):
+        """{"opponent_id", "stage", "choices": {user_id: card}} for a player in a battle, or None."""
+
+    @abc.abstractmethod
+    async def battle_start(self, user_a, user_b):
+        """Put both players in a new battle; False if either is already in one."""
+
+    @abc.abstractmethod
+    async def battle_choose(self, user_id, card):
+        """Record the player's fighter and return their battle, or None if they can't pick now.
+
+        When this pick completes the pair, the stage flips to "fighting" in the same step, so
+        exactly one caller gets back a battle holding both choices and starts the fight.
+        """
+
+    @abc.abstractmethod
+    async def battle_end(self, *user_ids):
+        """Remove these players from their battles."""
+
+    # -------------------- LOCK --------------------
+    @abc.abstractmethod
+    async def is_locked(self):
+        """True while the owner has the bot locked."""
+
+    @abc.abstractmethod
+    async def set_locked(self, locked):
+        """Lock or unlock the bot for everyone but the owner."""
+
+    @abc.abstractmethod
+    async def counts(self):
+        """{"spawns": active spawns, "battles": players in battles} for metrics."""
+
+
+# Operations a RemoteState may invoke on the server
+OPERATIONS = frozenset(name for name in vars(StateStore) if not name.startswith("_"))
+
+
+class LocalState(StateStore):
+    """In-process state; also what a StateServer serves. No method awaits, so each one is atomic."""
+
+    def __init__(self, spawns=None):
+        self.spawns = spawns or SpawnManager()
+        self.battles = {}  # {user_id: {"opponent_id":..., "stage":..., "choices":{}}}
+        self.locked = False
+
+    async def spawn_tick(self, channel_id):
+        return self.spawns.tick(channel_id)
+
+    async def spawn_set(self, channel_id, character):
+        self.spawns.spawn(channel_id, character)
+
+    async def spawn_get(self, channel_id):
+        return self.spawns.get(channel_id)
+
+    async def spawn_clear(self, channel_id, character=None):
+        return self.spawns.clear(channel_id, character)
+
+    async def spawn_claim(self, channel_id, character=None):
+        return self.spawns.claim(channel_id, character)
+
+    async def battle_get(self, user_id):
+        return self.battles.get(user_id)
+
+    async def battle_start(self, user_a, user_b):
+        if user_a in self.battles or user_b in self.battles:
+            return False
+        self.battles[user_a] = {"opponent_id": user_b, "stage": "choose", "choices": {}}
+        self.battles[user_b] = {"opponent_id": user_a, "stage": "choose", "choices": {}}
+        return True
+
+    async def battle_choose(self, user_id, card):
+        battle = self.battles.get(user_id)
+        if battle is None or battle["stage"] != "choose":
+            return None
+        opponent = self.battles.get(battle["opponent_id"])
+        # mirror the choice into the opponent's record so both sides see both picks
+        for record in (battle, opponent):
+            if record is not None:
+                record["choices"][user_id] = card
+        if battle["opponent_id"] in battle["choices"]:
+            for record in (battle, opponent):
+                if record is not None:
+                    record["stage"] = "fighting"
+        return battle
+
+    async def battle_end(self, *user_ids):
+        for user_id in user_ids:
+            self.battles.pop(user_id, None)
+
+    async def is_locked(self):
+        return self.locked
+
+    async def set_locked(self, locked):
+        self.locked = bool(locked)
+
+    async def counts(self):
+        return {"spawns": self.spawns.active_count(), "battles": len(self.battles)}
+
+
+# -------------------- WIRE FORMAT --------------------
+# One JSON object per line. Requests: {"id", "op", "args"}; replies: {"id", "result"} or {"id", "error"}.
+def _int_keys(obj):
+    # JSON object keys are strings; user-id keyed maps (battle choices) need their ints back
+    return {int(k) if k.isdigit() else k: v for k, v in obj.items()}
+
+
+def _encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def _decode(line):
+    return json.loads(line, object_hook=_int_keys)
+
+
+class RemoteState(StateStore):
+    """Client for a StateServer over one pipelined TCP connection (reconnects on demand).
+
+    The lock flag is read on every message, so it is cached for `lock_ttl` seconds;
+    `!lock` / `!unlock` reach other processes within that window.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, timeout=5.0, lock_ttl=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.lock_ttl = lock_ttl
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+        self._pending = {}  # {request id: future}
+        self._next_id = 0
+        self._locked = False
+        self._locked_at = float("-inf")
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """tcp://host:port"""
+        parts = urlsplit(url)
+        return cls(parts.hostname or "127.0.0.1", parts.port or 8765, **kwargs)
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self._reader_task = asyncio.create_task(self._read(reader, self._writer))
+
+    async def _read(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                message = _decode(line)
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(StateError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        except (OSError, ValueError) as e:
+            print(f"State server connection error: {e}")
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("state server connection lost"))
+
+    async def _call(self, op, *args):
+        if self._writer is None:
+            await self._connect()
+        writer = self._writer
+        if writer is None:
+            raise ConnectionError("state server connection lost")
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            writer.write(_encode({"id": request_id, "op": op, "args": args}))
+            await writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+    async def spawn_tick(self, channel_id):
+        return await self._call("spawn_tick", channel_id)
+
+    async def spawn_set(self, channel_id, character):
+        return await self._call("spawn_set", channel_id, character)
+
+    async def spawn_get(self, channel_id):
+        return await self._call("spawn_get", channel_id)
+
+    async def spawn_clear(self, channel_id, character=None):
+        return await self._call("spawn_clear", channel_id, character)
+
+    async def spawn_claim(self, channel_id, character=None):
+        return await self._call("spawn_claim", channel_id, character)
+
+    async def battle_get(self, user_id):
+        return await self._call("battle_get", user_id)
+
+    async def battle_start(self, user_a, user_b):
+        return await self._call("battle_start", user_a, user_b)
+
+    async def battle_choose(self, user_id, card):
+        return await self._call("battle_choose", user_id, card)
+
+    async def battle_end(self, *user_ids):
+        return await self._call("battle_end", *user_ids)
+
+    async def is_locked(self):
+        now = time.monotonic()
+        if now - self._locked_at > self.lock_ttl:
+            self._locked = await self._call("is_locked")
+            self._locked_at = now
+        return self._locked
+
+    async def set_locked(self, locked):
+        await self._call("set_locked", locked)
+        self._locked, self._locked_at = bool(locked), time.monotonic()
+
+    async def counts(self):
+        return await self._call("counts")
+
+
+class StateServer:
+    """Serves a LocalState to RemoteState clients. Requests run one at a time on the event loop."""
+
+    def __init__(self, state=None, host="127.0.0.1", port=8765):
+        self.state = state or LocalState()
+        self.host = host
+        self.port = port
+        self._server = None
+        self._clients = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        self._clients.add(writer)
+        try:
+            while line := await reader.readline():
+                request_id = None
+                try:
+                    message = _decode(line)
+                    request_id = message.get("id")
+                    op = message["op"]
+                    if op not in OPERATIONS:
+                        raise StateError(f"unknown operation {op!r}")
+                    reply = {"id": request_id, "result": await getattr(self.state, op)(*message.get("args", ()))}
+                except Exception as e:
+                    reply = {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+                writer.write(_encode(reply))
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+async def _serve(host, port):
+    server = StateServer(host=host, port=port)
+    await server.start()
+    print(f"State server listening on {host}:{port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
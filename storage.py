@@ -0,0 +1,162 @@
+# storage.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+# Per-connection tuning, applied to the writer and every reader
+CONNECTION_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache
+    "PRAGMA mmap_size=134217728",    # 128 MB memory-mapped reads
+    "PRAGMA busy_timeout=5000",
+)
+# Only the writer needs these (journal_mode is persistent for the database file)
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+) + CONNECTION_PRAGMAS
+
+
+class Transaction:
+    """Thin wrapper around the writer connection that records query timings."""
+
+    def __init__(self, storage, conn):
+        self._storage = storage
+        self._conn = conn
+
+    async def execute(self, sql, params=()):
+        start = time.perf_counter()
+        cursor = await self._conn.execute(sql, params)
+        self._storage._record(sql, time.perf_counter() - start)
+        return cursor
+
+    async def executemany(self, sql, seq):
+        start = time.perf_counter()
+        cursor = await self._conn.executemany(sql, seq)
+        self._storage._record(sql, time.perf_counter() - start)
+        return cursor
+
+    async def fetchone(self, sql, params=()):
+        cursor = await self.execute(sql, params)
+        return await cursor.fetchone()
+
+    async def fetchall(self, sql, params=()):
+        cursor = await self.execute(sql, params)
+        return await cursor.fetchall()
+
+
+class Storage:
+    """Long-lived SQLite access: one WAL writer plus a small pool of read-only connections.
+
+    Create once, `await open()` at startup and route every query through it.
+    Writes are serialized on the single writer; reads never wait on writes.
+    """
+
+    def __init__(self, path="anime.db", readers=4):
+        self.path = path
+        self.reader_count = readers
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = None
+        self._all_readers = []
+        self._timings = {}  # {normalized sql: [count, total_seconds, max_seconds]}
+        self.on_query = None  # optional callback(sql, seconds), e.g. for metrics export
+
+    async def open(self):
+        if self._writer is not None:
+            return
+        # writer first: it creates the file and switches it to WAL before readers attach
+        self._writer = await aiosqlite.connect(self.path, isolation_level=None)
+        for pragma in WRITER_PRAGMAS:
+            await self._writer.execute(pragma)
+        self._readers = asyncio.Queue()
+        for _ in range(self.reader_count):
+            conn = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True, isolation_level=None)
+            for pragma in CONNECTION_PRAGMAS:
+                await conn.execute(pragma)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        if self._writer is not None:
+            # refresh planner statistics for tables whose query patterns warrant it (cheap no-op otherwise)
+            await self._writer.execute("PRAGMA optimize")
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._readers = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    # -------------------- TIMING --------------------
+    def _record(self, sql, elapsed):
+        key = " ".join(sql.split())
+        stat = self._timings.get(key)
+        if stat is None:
+            stat = self._timings[key] = [0, 0.0, 0.0]
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+        if self.on_query is not None:
+            self.on_query(sql, elapsed)
+
+    def timings(self):
+        """Return [(sql, count, total_ms, avg_ms, max_ms)] sorted by total time spent."""
+        out = []
+        for sql, (count, total, worst) in self._timings.items():
+            out.append((sql, count, total * 1000, total * 1000 / count, worst * 1000))
+        out.sort(key=lambda t: t[2], reverse=True)
+        return out
+
+    def reset_timings(self):
+        self._timings.clear()
+
+    # -------------------- READS --------------------
+    @asynccontextmanager
+    async def reader(self):
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def fetchone(self, sql, params=()):
+        async with self.reader() as conn:
+            start = time.perf_counter()
+            cursor = await conn.execute(sql, params)
+            row = await cursor.fetchone()
+            await cursor.close()
+            self._record(sql, time.perf_counter() - start)
+        return row
+
+    async def fetchall(self, sql, params=()):
+        async with self.reader() as conn:
+            start = time.perf_counter()
+            cursor = await conn.execute(sql, params)
+            rows = await cursor.fetchall()
+            await cursor.close()
+            self._record(sql, time.perf_counter() - start)
+        return rows
+
+    # -------------------- WRITES --------------------
+    @asynccontextmanager
+    async def transaction(self):
+        """Serialize on the writer and run the block inside BEGIN IMMEDIATE ... COMMIT."""
+        async with self._write_lock:
+            await self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield Transaction(self, self._writer)
+            except BaseException:
+                await self._writer.execute("ROLLBACK")
+                raise
+            else:
+                await self._writer.execute("COMMIT")
+
+    async def execute(self, sql, params=()):
+        """Run a single write statement in its own transaction and return the cursor."""
+        async with self.transaction() as tx:
+            return await tx.execute(sql, params)
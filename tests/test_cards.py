@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+
+from cards import delete_cards, selection_cards
+
+
+class SQLiteDB:
+    """The slice of the storage/transaction API that cards.py uses, over plain sqlite3."""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", isolation_level=None)
+
+    async def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    async def fetchone(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchone()
+
+    async def fetchall(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+
+def make_db(cards):
+    """cards: (user_id, name, rarity, level, iv, stat) rows, slotted in order per user."""
+    db = SQLiteDB()
+    db.conn.execute(
+        "CREATE TABLE collection (user_id INTEGER, character_name TEXT, anime TEXT, rarity TEXT, hp INTEGER, "
+        "attack INTEGER, defense INTEGER, speed INTEGER, iv INTEGER, level INTEGER DEFAULT 1, exp INTEGER DEFAULT 0, slot INTEGER)"
+    )
+    slots = {}
+    for user_id, name, rarity, level, iv, stat in cards:
+        slot = slots[user_id] = slots.get(user_id, 0) + 1
+        db.conn.execute(
+            "INSERT INTO collection (user_id, character_name, anime, rarity, hp, attack, defense, speed, iv, level, slot) "
+            "VALUES (?, ?, 'Naruto', ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, name, rarity, stat, stat, stat, stat, iv, level, slot),
+        )
+    return db
+
+
+def test_duplicates_keep_best_keeps_the_rarest_copy():
+    db = make_db([
+        (1, "Naruto Uzumaki", "Mythic", 1, 2, 10),
+        (1, "Naruto Uzumaki", "Common", 1, 31, 50),
+    ])
+    mythic, common = (row[0] for row in db.conn.execute("SELECT ROWID FROM collection ORDER BY slot"))
+    preview = asyncio.run(selection_cards(db, 1, ("duplicates",)))
+    assert preview == [(common, "Common")]
+
+
+def test_duplicates_keep_best_prefers_stat_total_over_iv():
+    db = make_db([
+        (1, "Goku", "Rare", 3, 31, 40),
+        (1, "Goku", "Rare", 3, 0, 60),
+    ])
+    low_stats, high_stats = (row[0] for row in db.conn.execute("SELECT ROWID FROM collection ORDER BY slot"))
+    preview = asyncio.run(selection_cards(db, 1, ("duplicates",)))
+    assert [rowid for rowid, _ in preview] == [low_stats]
+
+
+def test_delete_cards_removes_only_previewed_rows_and_renumbers():
+    db = make_db([
+        (1, "Goku", "Common", 1, 1, 10),
+        (1, "Goku", "Common", 1, 2, 10),
+        (1, "Saitama", "Common", 1, 3, 10),
+        (2, "Goku", "Common", 1, 4, 10),
+    ])
+    preview = asyncio.run(selection_cards(db, 1, ("range", 1, 2)))
+    assert asyncio.run(delete_cards(db, 1, [rowid for rowid, _ in preview])) == 2
+    rows = db.conn.execute("SELECT user_id, slot, character_name FROM collection ORDER BY user_id, slot").fetchall()
+    assert rows == [(1, 1, "Saitama"), (2, 1, "Goku")]
@@ -0,0 +1,102 @@
+# timers.py
+import asyncio
+import inspect
+import math
+
+
+class Timer:
+    """Handle for a scheduled callback; `cancel()` is O(1) and safe to call more than once."""
+    __slots__ = ("target", "callback", "args", "_slot")
+
+    def __init__(self, target, callback, args, slot):
+        self.target = target
+        self.callback = callback
+        self.args = args
+        self._slot = slot
+
+    @property
+    def active(self):
+        return self._slot is not None
+
+    def cancel(self):
+        if self._slot is not None:
+            self._slot.pop(self, None)
+            self._slot = None
+
+
+class TimerWheel:
+    """Hashed timing wheel: every delayed event in the bot shares one driver task.
+
+    Timers land in slot `target_tick % slots`; each tick the driver visits one slot and
+    fires the timers whose tick has come (later laps stay put). Scheduling and cancelling
+    are a dict insert/delete, so tens of thousands of pending spawn expiries and prompt
+    timeouts cost no tasks and no event-loop heap entries. Resolution is one `tick`.
+    """
+
+    def __init__(self, tick=0.5, slots=1024):
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]  # {Timer: None}, used as an ordered set
+        self._ticks = 0        # last tick processed
+        self._origin = None    # loop time of tick 0
+        self._task = None
+        self._running = set()  # tasks started by async callbacks
+        self.fired = 0
+
+    def start(self):
+        if self._task is None:
+            loop = asyncio.get_running_loop()
+            if self._origin is None:
+                self._origin = loop.time()
+            self._task = loop.create_task(self._drive())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _current_tick(self):
+        return int((asyncio.get_running_loop().time() - self._origin) / self.tick)
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) after about `delay` seconds; coroutine functions run as tasks."""
+        self.start()
+        target = max(self._ticks, self._current_tick()) + max(1, math.ceil(delay / self.tick))
+        slot = self._slots[target % len(self._slots)]
+        timer = Timer(target, callback, args, slot)
+        slot[timer] = None
+        return timer
+
+    async def _drive(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max(0.0, self._origin + (self._ticks + 1) * self.tick - loop.time()))
+            # catch up on every tick we slept through (e.g. after a stall) so nothing is skipped
+            now = self._current_tick()
+            while self._ticks < now:
+                self._ticks += 1
+                self._fire(self._slots[self._ticks % len(self._slots)])
+
+    def _fire(self, slot):
+        due = [timer for timer in slot if timer.target <= self._ticks]
+        for timer in due:
+            if timer._slot is None:
+                continue  # cancelled by an earlier callback in this batch
+            timer.cancel()
+            self.fired += 1
+            try:
+                result = timer.callback(*timer.args)
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self._running.add(task)
+                    task.add_done_callback(self._finished)
+            except Exception as e:
+                print(f"Timer callback {getattr(timer.callback, '__name__', timer.callback)} failed: {e}")
+
+    def _finished(self, task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            print(f"Timer task failed: {type(e).__name__}: {e}")
+
+    def pending(self):
+        return sum(len(slot) for slot in self._slots)
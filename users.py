@@ -0,0 +1,68 @@
+# users.py
+import asyncio
+import time
+
+import discord
+
+
+class UserResolver:
+    """Display-name lookups that try the gateway cache before the REST API.
+
+    Order: guild member cache -> client user cache -> TTL name cache -> fetch_user.
+    Concurrent lookups of the same id share one request, and REST calls are bounded
+    by a semaphore so a leaderboard render can't burst the rate limit.
+    """
+
+    def __init__(self, client, ttl=600.0, concurrency=4):
+        self.client = client
+        self.ttl = ttl
+        self._names = {}  # {user_id: (display_name or None, expires_at)}
+        self._inflight = {}
+        self._sem = asyncio.Semaphore(concurrency)
+        self.fetches = 0
+
+    @staticmethod
+    def mention(user_id):
+        """Mention string for a user id; Discord renders it client-side, no lookup needed."""
+        return f"<@{user_id}>"
+
+    def _from_gateway(self, user_id, guild=None):
+        if guild is not None:
+            member = guild.get_member(user_id)
+            if member is not None:
+                return member.display_name
+        user = self.client.get_user(user_id)
+        return user.display_name if user is not None else None
+
+    async def display_name(self, user_id, guild=None):
+        """Best display name for the user, or a `User ID ...` placeholder if they can't be found."""
+        name = self._from_gateway(user_id, guild)
+        if name is not None:
+            return name
+        cached = self._names.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            name = cached[0]
+        else:
+            pending = self._inflight.get(user_id)
+            if pending is None:
+                pending = self._inflight[user_id] = asyncio.ensure_future(self._fetch(user_id))
+                pending.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+            name = await asyncio.shield(pending)
+        return name if name is not None else f"User ID {user_id}"
+
+    async def display_names(self, user_ids, guild=None):
+        """Resolve many ids concurrently; returns names in the same order."""
+        return await asyncio.gather(*(self.display_name(uid, guild) for uid in user_ids))
+
+    async def _fetch(self, user_id):
+        async with self._sem:
+            self.fetches += 1
+            try:
+                user = await self.client.fetch_user(user_id)
+                name = user.display_name
+            except discord.NotFound:
+                name = None  # cache the miss too, deleted accounts stay deleted
+            except discord.HTTPException:
+                return None  # transient; don't cache
+        self._names[user_id] = (name, time.monotonic() + self.ttl)
+        return name